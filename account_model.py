@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from engine import MONTHS, START, cohort_starts
+
+# months of linear ramp-up: 25%, 50%, 75%, 100%
+RAMP_MONTHS = 4
+ACCOUNTS_PER_CHUNK = 20_000
+
+# dashboard inputs turned into packs and activations by the account model, fixed while its output overrides
+# the aggregate ramp-up
+ACCOUNT_MODEL_INPUTS = ['active_accounts_number', 'patients_per_one_account_per_week', 'pack_growth',
+                        'new_accounts_per_year', 'medreps_number']
+
+
+def activation_months(priority: np.ndarray, capacity_per_month: int, start_month: int = 0) -> np.ndarray:
+    """Month each account is activated: in descending priority, at most capacity_per_month per month"""
+    rank = np.empty(len(priority), dtype=np.int64)
+    rank[np.argsort(-np.asarray(priority, dtype=float), kind='stable')] = np.arange(len(priority))
+    return start_month + rank // max(int(capacity_per_month), 1)
+
+
+def account_packs(weekly_volume, activation, growth, ramp_months=RAMP_MONTHS, months: int = MONTHS,
+                  weeks=4) -> np.ndarray:
+    """(accounts, months) packs: linear ramp over ramp_months from activation, then month-to-month growth
+    compounded from the activation month, the curve of engine.calc_packs.
+
+    weeks is the flat 4 or the (months,) weeks of volume of every calendar month"""
+    weekly_volume, activation, growth, ramp_months = (np.asarray(i, dtype=float)[..., None] for i in
+                                                      (weekly_volume, activation, growth, ramp_months))
+    age = np.arange(months) - activation
+    factor = np.where(age < ramp_months, np.clip((age + 1) / ramp_months, 0, 1), (1 + growth / 100) ** age)
+    return weekly_volume * weeks * factor
+
+
+def monthly_packs(weekly_volume, activation, growth, ramp_months=RAMP_MONTHS, months: int = MONTHS,
+                  weeks=4) -> np.ndarray:
+    """Monthly packs of all accounts, the accounts x months matrix is reduced chunk by chunk to bound memory"""
+    weekly_volume, activation, growth, ramp_months = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(i, dtype=float)) for i in (weekly_volume, activation, growth, ramp_months)))
+    total = np.zeros(months)
+    for i in range(0, len(weekly_volume), ACCOUNTS_PER_CHUNK):
+        part = slice(i, i + ACCOUNTS_PER_CHUNK)
+        total += account_packs(weekly_volume[part], activation[part], growth[part], ramp_months[part],
+                               months, weeks).sum(axis=0)
+    return np.trunc(total)
+
+
+def activation_counts(activation: np.ndarray, months: int = MONTHS) -> np.ndarray:
+    """(months,) accounts activated in every month of the horizon"""
+    activation = np.asarray(activation, dtype=np.int64)
+    return np.bincount(activation[activation < months], minlength=months).astype(float)
+
+
+def cohort_activation_months(sizes: list, starts: np.ndarray, capacity_per_month: int) -> np.ndarray:
+    """Activation month of every account of consecutive cohorts, cohort i from month starts[i] on.
+
+    All cohorts share one queue of at most capacity_per_month activations per month, a cohort that arrives
+    while the previous one is still being activated waits for the free slots."""
+    capacity = max(int(capacity_per_month), 1)
+    slots = []
+    free = 0
+    for size, first_month in zip(sizes, starts):
+        first = max(int(first_month) * capacity, free)
+        slots.append(np.arange(first, first + size))
+        free = first + size
+    return np.concatenate(slots, dtype=np.int64) // capacity if slots else np.empty(0, dtype=np.int64)
+
+
+def registry_model(accounts: pd.DataFrame, active_accounts: int, packs_per_week: float, growth: float,
+                   capacity_per_month: int, months: int = MONTHS, weeks=4, new_accounts: int = 0,
+                   start: str = START) -> tuple:
+    """Monthly packs and accounts activated per month of the active_accounts highest-volume institutions of a
+    registry selection, then new_accounts more each January from the following year while the selection lasts.
+
+    Registry columns weekly_volume, growth and ramp_months override the dashboard values per institution."""
+    def column(name: str, default: float) -> np.ndarray:
+        if name in accounts:
+            return accounts[name].to_numpy(dtype=float, na_value=default)
+        return np.full(len(accounts), float(default))
+
+    weekly_volume = column('weekly_volume', packs_per_week)
+    priority = weekly_volume * column('physicians', 1)
+    starts = cohort_starts(start, months)
+    sizes = np.diff(np.minimum([0, *np.cumsum([int(active_accounts)] + [int(new_accounts)] * (len(starts) - 1))],
+                               len(accounts)))
+    active = np.argsort(-priority, kind='stable')[:sizes.sum()]
+    activation = cohort_activation_months(sizes, starts, capacity_per_month)
+    packs = monthly_packs(weekly_volume[active],
+                          activation,
+                          column('growth', growth)[active],
+                          column('ramp_months', RAMP_MONTHS)[active],
+                          months, weeks)
+    return packs, activation_counts(activation, months)
+
@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cache import canonical_hash
+from tables import read_table
+
+# environment variable with the path of the CSV/Parquet account registry
+ACCOUNTS_PATH_ENV = 'DSX_ACCOUNTS_PATH'
+
+CATEGORY_COLUMNS = ['district', 'region', 'type']
+
+# accounts per Moscow district used when there is no registry file
+districts_data = [
+    ['ВАО', 14],
+    ['ЗАО', 14],
+    ['САО', 11],
+    ['СВАО', 14],
+    ['СЗАО', 6],
+    ['ЦАО', 10],
+    ['ЮВАО', 24],
+    ['ЮЗАО', 16],
+    ['ЮАО', 20]
+]
+
+
+@dataclass(frozen=True)
+class AccountRegistry:
+    """Institutions with a precomputed district -> row positions index and a content hash for cache keys"""
+    accounts: pd.DataFrame
+    district_rows: dict
+    district_counts: dict
+    key: str
+
+    @property
+    def districts(self) -> list:
+        return list(self.district_rows)
+
+    def count(self, districts: list) -> int:
+        return sum(self.district_counts.get(i, 0) for i in districts)
+
+    def rows(self, districts: list) -> np.ndarray:
+        parts = [self.district_rows[i] for i in districts if i in self.district_rows]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def select(self, districts: list) -> pd.DataFrame:
+        return self.accounts.iloc[self.rows(districts)]
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Categoricals for text columns, the narrowest integer dtype for whole numbers, float32 for the rest"""
+    df = df.copy()
+    for column in df.columns:
+        values = df[column]
+        if column in CATEGORY_COLUMNS or values.dtype == object:
+            df[column] = pd.Categorical(values, categories=pd.unique(values.dropna()))
+        elif pd.api.types.is_bool_dtype(values):
+            continue
+        elif pd.api.types.is_integer_dtype(values):
+            df[column] = pd.to_numeric(values, downcast='unsigned' if values.min() >= 0 else 'integer')
+        elif pd.api.types.is_float_dtype(values):
+            if values.notna().all() and np.array_equal(values, np.round(values)):
+                values = values.astype(np.int64)
+                df[column] = pd.to_numeric(values, downcast='unsigned' if values.min() >= 0 else 'integer')
+            else:
+                df[column] = pd.to_numeric(values, downcast='float')
+    return df
+
+
+def build_registry(accounts: pd.DataFrame) -> AccountRegistry:
+    accounts = compact_frame(accounts).reset_index(drop=True)
+    codes = accounts['district'].cat.codes.to_numpy()
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=len(accounts['district'].cat.categories))
+    rows = np.split(order[codes[order] >= 0], np.cumsum(counts)[:-1])
+    districts = accounts['district'].cat.categories
+    return AccountRegistry(accounts=accounts,
+                           district_rows=dict(zip(districts, rows)),
+                           district_counts=dict(zip(districts, counts.tolist())),
+                           key=canonical_hash(accounts))
+
+
+def load_account_registry(path: str) -> AccountRegistry:
+    """Registry from a CSV/Parquet file with one institution per row and at least a 'district' column"""
+    accounts = read_table(path)
+    if 'district' not in accounts:
+        raise ValueError(f"Account registry {path} has no 'district' column")
+    return build_registry(accounts)
+
+
+def registry_from_district_counts(data: list = None) -> AccountRegistry:
+    """Registry with one synthetic institution per account of the district counts"""
+    districts, counts = zip(*(districts_data if data is None else data))
+    accounts = pd.DataFrame({'account_id': np.arange(sum(counts)),
+                             'district': np.repeat(districts, counts),
+                             'type': 'ЛПУ',
+                             'physicians': 6})
+    return build_registry(accounts)
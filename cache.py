@@ -0,0 +1,102 @@
+import dataclasses
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import numpy as np
+import pandas as pd
+
+
+def _canonical(value):
+    # JSON-ready form where equal inputs map to equal structures: 5 == 5.0, tuple == list, dict keys sorted by dumps
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {'__type__': type(value).__name__,
+                **{f.name: _canonical(getattr(value, f.name)) for f in dataclasses.fields(value)}}
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest = hashlib.blake2b(pd.util.hash_pandas_object(value).to_numpy().tobytes(), digest_size=16)
+        columns = list(map(str, value.columns)) if isinstance(value, pd.DataFrame) else str(value.name)
+        return {'__frame__': columns, 'shape': value.shape, 'digest': digest.hexdigest()}
+    if isinstance(value, dict) or hasattr(value, 'items'):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(i) for i in value]
+    if isinstance(value, np.ndarray):
+        if value.ndim == 0:
+            return _canonical(value.item())
+        data = np.ascontiguousarray(value)
+        return {'__array__': str(data.dtype), 'shape': data.shape,
+                'digest': hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest()}
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    if value is None or isinstance(value, str):
+        return value
+    return repr(value)
+
+
+def canonical_hash(value) -> str:
+    """Stable digest of model inputs: dataclasses, mappings, sequences, scalars and NumPy arrays"""
+    payload = json.dumps(_canonical(value), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional time-to-live and hit/miss counters, shared between sessions"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or self._expired(item[0]):
+                if item is not None:
+                    del self._data[key]
+                    self.evictions += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, func: Callable):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            # computed outside of the lock, concurrent misses of one key may both compute
+            value = func()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hits / total if total else 0.0}
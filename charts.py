@@ -0,0 +1,199 @@
+import copy
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+month_name = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+WATERFALL_COLUMNS = ['revenue', 'COGS', 'salary', 'repr_exp', 'bonus_Q', 'bonus_Y',
+                     'support_fee', 'initial_event', 'supporting_opex', 'profit']
+
+# longer monthly series are aggregated to quarters, then to years
+MAX_BARS = 60
+MAX_LINE_POINTS = 240
+CONNECTOR = {"line": {"color": "rgb(63, 63, 63)"}}
+
+
+def month_labels(dates) -> list:
+    """Axis labels of monthly dates: month names within one year, 'Jan 25' style over several years"""
+    dates = pd.to_datetime(pd.Series(dates))
+    if dates.dt.year.nunique() == 1:
+        return [month_name[i - 1] for i in dates.dt.month]
+    return [f'{month_name[m - 1]} {y % 100:02d}' for m, y in zip(dates.dt.month, dates.dt.year)]
+
+
+def horizon_label(months: int) -> str:
+    years = max(round(months / 12), 1)
+    if years == 1:
+        return 'год'
+    return f"{years} {'года' if years < 5 else 'лет'}"
+
+
+def periods(dates, max_points: int = MAX_BARS) -> tuple:
+    """Axis labels and first positions of the months, quarters or years that keep a series within max_points"""
+    dates = pd.to_datetime(pd.Series(dates))
+    if len(dates) <= max_points:
+        return month_labels(dates), np.arange(len(dates))
+    years, months = dates.dt.year.to_numpy(), dates.dt.month.to_numpy()
+    if len(dates) <= max_points * 3:
+        codes = years * 4 + (months - 1) // 3
+        labels = [f'Q{code % 4 + 1} {code // 4 % 100:02d}' for code in codes]
+    else:
+        codes = years
+        labels = [str(code) for code in codes]
+    starts = np.flatnonzero(np.r_[True, np.diff(codes) != 0])
+    return [labels[i] for i in starts], starts
+
+
+def aggregate(values, starts: np.ndarray, how: str = 'sum') -> np.ndarray:
+    """Per-period sums of a monthly flow, or period-end values of a cumulative series with how='last'"""
+    values = np.asarray(values)
+    if len(starts) == len(values):
+        return values
+    if how == 'last':
+        return values[np.r_[starts[1:], len(values)] - 1]
+    return np.add.reduceat(values, starts)
+
+
+def _text(values) -> list:
+    # text labels as the trace validator would coerce them
+    return [str(i) for i in values]
+
+
+def _merge(target: dict, updates: dict) -> dict:
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+@lru_cache(maxsize=None)
+def _template(name: str) -> dict:
+    # styling of every chart built and validated once per process, without data and default theme
+    fig = {
+        'pnl_waterfall': lambda: go.Figure(go.Waterfall(
+            name="20", orientation="v",
+            measure=["absolute",
+                     "relative", "relative", "relative", "relative",
+                     "relative", "relative", "relative", "relative",
+                     "total",
+                     ],
+            x=WATERFALL_COLUMNS,
+            textposition="outside",
+            connector=CONNECTOR,
+        ), layout={'showlegend': False}),
+        'revenue_profit_bars': lambda: go.Figure([go.Bar(name='Revenue'), go.Bar(name='Profit')],
+                                                 layout={'title': "тыс. руб. без НДС", 'showlegend': False}),
+        'monthly_profit_waterfall': lambda: go.Figure(go.Waterfall(
+            name="20", orientation="v",
+            textposition="outside",
+            connector=CONNECTOR,
+        ), layout={'showlegend': False}),
+        'packs_bars': lambda: go.Figure(go.Bar(name='Profit'), layout={'showlegend': False}),
+        'simulation_fan': lambda: go.Figure([
+            go.Scatter(name='P95', line={'width': 0}),
+            go.Scatter(name='P5', line={'width': 0}, fill='tonexty', fillcolor='rgba(99, 110, 250, 0.3)'),
+            go.Scatter(name='P50', line={'color': 'rgb(99, 110, 250)'}),
+        ], layout={'showlegend': False}),
+    }[name]().to_dict()
+    fig['layout'].pop('template', None)
+    return fig
+
+
+def from_template(name: str, traces: list, layout: dict) -> go.Figure:
+    """Copy of a cached chart template with new trace data and layout values, built without re-validation"""
+    spec = copy.deepcopy(_template(name))
+    for trace, updates in zip(spec['data'], traces):
+        trace.update(updates)
+    _merge(spec['layout'], layout)
+    return go.Figure(spec, _validate=False)
+
+
+def pnl_waterfall(df: pd.DataFrame) -> go.Figure:
+    totals = [df[i].sum() for i in WATERFALL_COLUMNS]
+    revenue_sum, profit_sum = totals[0], totals[-1]
+    years = pd.to_datetime(df['date']).dt.year
+
+    min_b = -10000 if profit_sum > 0 else profit_sum * 1.8
+    max_b = revenue_sum * 1.2
+    return from_template('pnl_waterfall', [{'y': totals, 'text': _text(totals)}], {
+        'title': {'text': f"P&L {years.min()}" if years.min() == years.max()
+                  else f"P&L {years.min()}-{years.max()}"},
+        'yaxis': {'range': [min_b, max_b]},
+    })
+
+
+def revenue_profit_bars(df: pd.DataFrame) -> go.Figure:
+    x, starts = periods(df['date'])
+    profit = aggregate(df['profit'], starts)
+    revenue = aggregate(df['revenue'], starts)
+
+    # thousands of rubles of the plotted, possibly aggregated bars, the axis keeps zero in view
+    min_a = min(profit.min() * 1.5, 0)
+    max_a = revenue.max() * 1.5
+    return from_template('revenue_profit_bars', [{'x': x, 'y': revenue.tolist()}, {'x': x, 'y': profit.tolist()}],
+                         {'yaxis': {'range': [min_a, max_a]}})
+
+
+def monthly_profit_waterfall(df: pd.DataFrame) -> go.Figure:
+    x, starts = periods(df['date'])
+    profit = aggregate(df['profit'], starts)
+    profit_sum = profit.sum()
+    return from_template('monthly_profit_waterfall', [{
+        'measure': ["relative"] * (len(profit) + 1),
+        'x': [*x, 'total'],
+        'text': _text([*profit.tolist(), profit_sum]),
+        'y': [*profit.tolist(), -profit_sum],
+    }], {'yaxis': {'range': [min(profit) * 4, max(profit) * 4]}})
+
+
+def packs_bars(df: pd.DataFrame) -> go.Figure:
+    packs_sum_str = f"{df['packs'].sum():,}".replace(',', ' ')
+    x, starts = periods(df['date'])
+    packs = aggregate(df['packs'], starts)
+
+    min_a = -100
+    max_a = max(packs) * 1.3
+    return from_template('packs_bars', [{'x': x, 'y': packs.tolist(), 'text': _text(packs.tolist())}], {
+        'title': {'text': f'Всего упаковок: {packs_sum_str}'},
+        'yaxis': {'range': [min_a, max_a]},
+    })
+
+
+def tornado_chart(sensitivity: pd.DataFrame, labels: list, pct: float, months: int = 12) -> go.Figure:
+    fig = go.Figure([
+        go.Bar(y=labels, x=sensitivity['low'] / 1000, name=f'-{pct}%', orientation='h'),
+        go.Bar(y=labels, x=sensitivity['high'] / 1000, name=f'+{pct}%', orientation='h'),
+    ])
+    fig.update_layout(
+        title=f'Изменение прибыли за {horizon_label(months)}, тыс. руб.',
+        barmode='overlay',
+        height=max(400, 30 * len(labels)))
+    return fig
+
+
+def simulation_fan(quantiles: dict, draws: int, dates=None) -> go.Figure:
+    months = len(quantiles[50])
+    if dates is None:
+        x, starts = (month_name if months == 12 else list(range(1, months + 1))), np.arange(months)
+    else:
+        x, starts = periods(dates, MAX_LINE_POINTS)
+    bands = {q: aggregate(values, starts, how='last') / 1000 for q, values in quantiles.items()}
+    return from_template('simulation_fan', [{'x': x, 'y': bands[95].tolist()}, {'x': x, 'y': bands[5].tolist()},
+                                            {'x': x, 'y': bands[50].tolist()}], {
+        'title': {'text': f'Накопленная прибыль, тыс. руб. ({draws:,} прогонов)'.replace(',', ' ')},
+    })
+
+
+def scenario_lines(names: list, rolling_profit: np.ndarray) -> go.Figure:
+    x = list(range(1, rolling_profit.shape[-1] + 1))
+    fig = go.Figure([go.Scatter(x=x, y=values / 1000, name=str(name), mode='lines')
+                     for name, values in zip(names, rolling_profit)])
+    fig.update_layout(
+        title='Накопленная прибыль, тыс. руб.',
+        xaxis_title='Месяц')
+    return fig
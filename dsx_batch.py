@@ -0,0 +1,106 @@
+"""Headless batch run of the model over a scenario file.
+
+    python dsx_batch.py scenarios.csv results.parquet --fte MedRep ProdMan --workers 8 --months 60
+
+Every column of the scenario file is a model input named like the dashboard widgets
+(pack_growth, active_accounts_number, mr_salary_gross, mr_tax_type, ...), inputs that
+are not in the file keep the dashboard defaults. An optional 'scenario' column names
+the rows. Only NumPy and pandas are imported, xlsxwriter only for .xlsx output.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from engine import (MONTHS, START, ModelParams, batch_frame, compute_batch, default_fte, ftes_salary_conditions,
+                    with_inputs)
+from tables import read_table
+from volume import VOLUME_CALENDARS
+
+MAX_MONTHS = 120
+
+
+def write_results(df: pd.DataFrame, scenarios: pd.DataFrame, path: str):
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    elif path.endswith('.xlsx'):
+        import export
+        export.write_workbook(path, {'Scenarios': scenarios, 'P&L': df})
+    else:
+        df.to_csv(path, index=False)
+
+
+def evaluate_chunk(base: ModelParams, columns: dict, scenario_ids: np.ndarray, start: str) -> pd.DataFrame:
+    return batch_frame(compute_batch(base, columns), start, scenario_ids)
+
+
+def chunks(scenarios: pd.DataFrame, chunk_size: int):
+    ids = scenarios['scenario'].to_numpy() if 'scenario' in scenarios else scenarios.index.to_numpy()
+    inputs = scenarios.drop(columns='scenario', errors='ignore')
+    for i in range(0, len(scenarios), chunk_size):
+        part = inputs.iloc[i:i + chunk_size]
+        yield {name: part[name].to_numpy() for name in part.columns}, ids[i:i + chunk_size]
+
+
+def run(scenarios: pd.DataFrame, base: ModelParams, chunk_size: int, workers: int, start: str) -> pd.DataFrame:
+    if workers <= 1:
+        frames = [evaluate_chunk(base, columns, ids, start) for columns, ids in chunks(scenarios, chunk_size)]
+    else:
+        parts = list(chunks(scenarios, chunk_size))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            frames = list(executor.map(evaluate_chunk, [base] * len(parts), [columns for columns, _ in parts],
+                                       [ids for _, ids in parts], [start] * len(parts)))
+    return pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the P&L model over a CSV/Parquet scenario file')
+    parser.add_argument('scenarios', help='CSV or Parquet file, one scenario per row')
+    parser.add_argument('output', help='.parquet, .xlsx or .csv file with the monthly P&L of every scenario')
+    parser.add_argument('--fte', nargs='+', default=default_fte, choices=list(ftes_salary_conditions),
+                        help='FTE roles in the staff plan')
+    parser.add_argument('--chunk-size', type=int, default=20_000, help='scenarios per vectorized batch')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes, 1 runs in-process')
+    parser.add_argument('--start', default=START, help='first month, YYYY-MM')
+    parser.add_argument('--months', type=int, default=MONTHS, help=f'horizon in months, up to {MAX_MONTHS}')
+    parser.add_argument('--volume-calendar', default='flat', choices=VOLUME_CALENDARS,
+                        help='weekly volume to months: flat 4 weeks, calendar days or working days')
+    args = parser.parse_args(argv)
+    if not 1 <= args.months <= MAX_MONTHS:
+        parser.error(f'--months must be between 1 and {MAX_MONTHS}')
+
+    scenarios = read_table(args.scenarios)
+    base = ModelParams.from_inputs({'chosen_fte': args.fte, 'horizon_months': args.months, 'start': args.start,
+                                    'volume_calendar': args.volume_calendar})
+    try:
+        with_inputs(base, {name: scenarios[name].iloc[:1].to_numpy() for name in scenarios.columns
+                           if name != 'scenario'})
+    except KeyError as e:
+        parser.error(str(e))
+    if args.output.endswith('.xlsx'):
+        import export
+        try:
+            export.check_rows('P&L', len(scenarios) * args.months)
+        except ValueError as e:
+            parser.error(str(e))
+
+    started = time.perf_counter()
+    try:
+        results = run(scenarios, base, args.chunk_size, args.workers, args.start)
+    except ValueError as e:
+        parser.error(str(e))
+    computed = time.perf_counter()
+    write_results(results, scenarios, args.output)
+    finished = time.perf_counter()
+
+    print(f'{len(scenarios):,} scenarios in {computed - started:.2f} s '
+          f'({len(scenarios) / max(computed - started, 1e-9):,.0f} scenarios/sec), '
+          f'written to {args.output} in {finished - computed:.2f} s', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
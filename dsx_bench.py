@@ -0,0 +1,161 @@
+"""Headless performance benchmarks of the model, the figures, Arrow serialization and Excel export.
+
+    python dsx_bench.py --output bench.json
+    python dsx_bench.py --output new.json --compare bench.json --threshold 0.25
+
+Every case is run after a warm-up call until --min-time seconds or --max-runs runs have passed,
+the median and the fastest run are written to a JSON file. With --compare the exit code is 1
+when the median of any case common to both files exceeds the baseline by more than --threshold.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import charts
+import export
+from engine import ModelParams, compute, ftes_salary_conditions, pnl_frame, pnl_totals, tax_condition, with_inputs
+from payroll import roster_payroll
+
+SCENARIOS = [1, 1_000, 100_000]
+MONTHS = [12, 120]
+ROLES = [3, 500]
+
+
+def measure(func, min_time: float = 0.5, max_runs: int = 50) -> dict:
+    func()
+    runs = []
+    started = time.perf_counter()
+    while len(runs) < 3 or (len(runs) < max_runs and time.perf_counter() - started < min_time):
+        run_started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - run_started)
+    return {'median_s': float(np.median(runs)), 'min_s': float(np.min(runs)), 'runs': len(runs)}
+
+
+def scenario_inputs(scenarios: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return {'pack_growth': rng.uniform(0, 20, scenarios),
+            'patients_per_one_account_per_week': rng.uniform(1, 8, scenarios),
+            'pack_price_owner': rng.uniform(2500, 4500, scenarios)}
+
+
+def synthetic_roster(roles: int, months: int, seed: int = 0) -> pd.DataFrame:
+    """One row of 1-5 positions for each of `roles` distinct roles"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'role': [f'role_{i}' for i in range(roles)],
+        'headcount': rng.integers(1, 6, roles),
+        'salary': rng.integers(50, 300, roles) * 1000,
+        'compensation': 25000,
+        'bonus_quarter': 20,
+        'bonus_year': 30,
+        'tax_type': rng.choice(list(tax_condition), roles),
+        'hire_date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, months * 30, roles), 'D'),
+        'raise_pct': 5,
+    })
+
+
+def model_cases():
+    for scenarios in SCENARIOS:
+        for months in MONTHS:
+            for roles in ROLES:
+                base = ModelParams.from_inputs({'chosen_fte': list(ftes_salary_conditions), 'horizon_months': months,
+                                                'new_accounts_per_year': 2})
+                inputs = scenario_inputs(scenarios)
+                if roles == len(ftes_salary_conditions):
+                    def run(base=base, inputs=inputs):
+                        return compute(with_inputs(base, inputs))
+                else:
+                    def run(base=base, inputs=inputs, roster=synthetic_roster(roles, months)):
+                        return compute(with_inputs(base, inputs),
+                                       payroll=roster_payroll(roster, base.horizon_months, base.start))
+                yield f'model/scenarios={scenarios}/months={months}/roles={roles}', run
+
+
+def output_frame(months: int) -> pd.DataFrame:
+    params = ModelParams.from_inputs({'chosen_fte': list(ftes_salary_conditions), 'horizon_months': months})
+    return pnl_frame(compute(params), params.start)
+
+
+def rendering_cases():
+    # pyarrow comes with streamlit, imported here so that model benchmarks run without it
+    import pyarrow as pa
+
+    for months in MONTHS:
+        df = output_frame(months)
+        yield f'figure/pnl_waterfall/months={months}', lambda df=df: charts.pnl_waterfall(df)
+        yield f'figure/revenue_profit_bars/months={months}', lambda df=df: charts.revenue_profit_bars(df)
+        yield f'figure/monthly_profit_waterfall/months={months}', lambda df=df: charts.monthly_profit_waterfall(df)
+        yield f'figure/packs_bars/months={months}', lambda df=df: charts.packs_bars(df)
+
+        # the typed monthly table and the separate totals frame of the dashboard
+        table = df.set_index('date')
+        totals = pnl_totals(df).to_frame('Итого').T
+        yield f'arrow/output_table/months={months}', lambda table=table: pa.Table.from_pandas(table)
+        yield f'arrow/output_totals/months={months}', lambda totals=totals: pa.Table.from_pandas(totals)
+
+        sheets = {'P&L': df, 'P&L totals': totals.reset_index(names='period')}
+        yield f'xlsx/output_table/months={months}', lambda sheets=sheets: export.workbook_bytes(sheets)
+
+
+def run_cases(name_filter: str = None, min_time: float = 0.5, max_runs: int = 50) -> dict:
+    results = {}
+    for cases in (model_cases(), rendering_cases()):
+        for name, func in cases:
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = measure(func, min_time, max_runs)
+            print(f"{name:<55} {results[name]['median_s'] * 1000:10.3f} ms", file=sys.stderr)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Cases whose median is slower than the baseline median by more than threshold, as (name, ratio)"""
+    regressions = []
+    for name, stats in results.items():
+        if name in baseline:
+            ratio = stats['median_s'] / baseline[name]['median_s']
+            print(f"{name:<55} {ratio:6.2f}x", file=sys.stderr)
+            if ratio > 1 + threshold:
+                regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the model, figures, Arrow serialization and Excel export')
+    parser.add_argument('--output', default='bench.json', help='JSON file with the timings of every case')
+    parser.add_argument('--filter', help='run only cases whose name contains this text, e.g. model/ or months=120')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds of repeated runs per case')
+    parser.add_argument('--max-runs', type=int, default=50, help='maximum runs per case')
+    parser.add_argument('--compare', help='baseline JSON file of an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown against the baseline, 0.25 = 25%%')
+    args = parser.parse_args(argv)
+
+    results = run_cases(args.filter, args.min_time, args.max_runs)
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'platform': {'python': platform.python_version(), 'machine': platform.machine(),
+                     'numpy': np.__version__, 'pandas': pd.__version__},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print('Regressions: ' + ', '.join(f'{name} {ratio:.2f}x' for name, ratio in regressions), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,57 +1,182 @@
-import io
+import os
 
 import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.graph_objects as go
 
+import charts
+import export
+from account_model import ACCOUNT_MODEL_INPUTS, registry_model
+from accounts import ACCOUNTS_PATH_ENV, AccountRegistry, load_account_registry, registry_from_district_counts
+from cache import LRUCache, canonical_hash
+from engine import (ModelParams, calc_packs, flat_inputs, pnl_frame, pnl_totals, ftes_salary_conditions,
+                    tax_condition)
+from graph import ModelGraph
+from jobs import CANCELLED, DONE, FAILED, JobRunner
+from payroll import ROSTER_PATH_ENV, load_roster, role_summary, roster_fixed_inputs, roster_payroll
+from portfolio import PORTFOLIO_PATH_ENV, PortfolioModel, load_portfolio, sku_result, sku_summary
+from profiler import StageProfiler
+from scenario_store import (STORE_PATH, STORE_PATH_ENV, ScenarioStore, comparison_frame, rolling_profit,
+                            scenario_batch_frame)
+from sensitivity import sensitivity_inputs, tornado
+from simulation import Distribution, run_monte_carlo
+from solver import break_even_month, solvable_inputs, solve
 from text_msg import InputTextRus
+from volume import VOLUME_CALENDARS, weeks_per_month
 
-ftes_salary_conditions = {
-    'MedRep': {
-        'salary': 100000,
-        'tax_index': 0,
-        'fullname': 'Medical Representative',
-        'fullname_rus': 'Медицинский представитель',
-        'shortname': 'mr',
-        'bonus_quarter': 20,
-        'bonus_year': 30,
-        'compensation': 25000,
-    },
-    'ProdMan': {
-        'salary': 1,
-        'tax_index': 0,
-        'fullname': 'Product Manager',
-        'fullname_rus': 'Продакт Менеджер',
-        'shortname': 'pm',
-        'bonus_quarter': 1,
-        'bonus_year': 1,
-        'compensation': 1,
-    },
-    'ComDir': {
-        'salary': 1,
-        'tax_index': 0,
-        'fullname': 'Commercial Director',
-        'fullname_rus': 'Коммерческий директор',
-        'shortname': 'cd',
-        'bonus_quarter': 1,
-        'bonus_year': 1,
-        'compensation': 1,
-    },
+months_num = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12']
+
+tm = InputTextRus()
+
+simulation_inputs = {
+    'pack_growth': 'Прирост упак. (мес-к-мес), %',
+    'patients_per_one_account_per_week': 'Упак. в нед. в одном ЛПУ',
+    'pack_price_pharmacy_change': 'Изменение цены для аптеки, %',
+    'active_accounts_number': 'Активных учреждений',
 }
 
-tax_condition = {
-    'ФизЛицо': 15,
-    'ЮрЛицо': 0,
+input_labels = {
+    'pack_price_pharmacy': tm.pack_price_pharmacy_label,
+    'pack_price_owner': tm.pack_price_owner_label,
+    'pack_price_manufacturer': tm.pack_price_manufacturer_label,
+    'pack_price_pharmacy_change': tm.pack_price_change_label,
+    'active_accounts_number': 'Активных учреждений в промоции',
+    'patients_per_one_account_per_week': 'Упак. в нед. в одном ЛПУ',
+    'pack_growth': 'Прирост упак. (мес-к-мес), %',
+    'agency_fee': 'Поддержание, %',
+    'initial_event': 'OPEX инициации на учреждение',
+    'supporting_OPEX': 'OPEX поддержания на учреждение',
+    'medreps_number': 'Кол-во медицинских представителей',
+    'new_accounts_per_year': 'Новых учреждений в год',
+    'salary_gross': tm.salary_label,
+    'compensation': tm.compensation_label,
+    'quarter_bonus': tm.quarter_bonus_label,
+    'year_bonus': tm.year_bonus_label,
 }
+integer_inputs = ['active_accounts_number', 'medreps_number']
+volume_calendar_labels = {
+    'flat': '4 недели в месяце',
+    'calendar': 'Календарные дни',
+    'workdays': 'Рабочие дни без праздников',
+}
+# rows of the output table serialized per rerun, longer horizons are paged
+TABLE_PAGE_ROWS = 60
 
-months_num = ['01', '02', '03', '04', '05', '06', '07', '08', '09', '10', '11', '12']
-month_name = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
 
-tm = InputTextRus()
+def input_label(name: str) -> str:
+    if name in input_labels:
+        return input_labels[name]
+    shortname, suffix = name.split('_', 1)
+    role = next(i for i in ftes_salary_conditions.values() if i['shortname'] == shortname)
+    return f"{role['fullname_rus']}: {input_labels[suffix]}"
+
+
+allocation_drivers = {
+    'revenue': 'Выручка',
+    'gross_margin': 'Валовая маржа',
+    'packs': 'Упаковки',
+    'equal': 'Поровну',
+    'weight': 'Вес из файла',
+}
+
+distribution_kinds = {
+    'Треугольное': 'triangular',
+    'Равномерное': 'uniform',
+    'Нормальное': 'normal',
+}
 
 st.set_page_config(layout="wide")
 
+
+@st.cache_resource
+def get_model_cache() -> LRUCache:
+    # one cache for all sessions: engine results, P&L frames and figures keyed by the hash of the inputs
+    return LRUCache(maxsize=512, ttl=60 * 60)
+
+
+model_cache = get_model_cache()
+
+
+@st.cache_resource
+def get_job_runner() -> JobRunner:
+    # long analyses run here, off the script thread, and are shared by all sessions with the same inputs
+    return JobRunner(max_workers=2, keep=64)
+
+
+job_runner = get_job_runner()
+
+
+@st.cache_resource
+def get_scenario_store() -> ScenarioStore:
+    return ScenarioStore(os.environ.get(STORE_PATH_ENV, STORE_PATH))
+
+
+scenario_store = get_scenario_store()
+
+
+# per-session dependency graph, on a cache miss only the line items affected by the changed inputs are recomputed
+if 'model_graph' not in st.session_state:
+    st.session_state.model_graph = ModelGraph()
+model_graph = st.session_state.model_graph
+model_graph.recomputed = []
+
+
+def rerun():
+    # st.rerun replaced st.experimental_rerun in Streamlit 1.27
+    if hasattr(st, 'rerun'):
+        st.rerun()
+    else:
+        st.experimental_rerun()
+
+
+def profile_requested() -> bool:
+    if hasattr(st, 'query_params'):
+        return st.query_params.get('profile') == '1'
+    return st.experimental_get_query_params().get('profile', [''])[0] == '1'
+
+
+# opt-in per-session stage timings, ?profile=1 or the sidebar checkbox
+if 'profiler' not in st.session_state:
+    st.session_state.profiler = StageProfiler()
+profiler = st.session_state.profiler
+profiler.start_run(profile_requested() or st.session_state.get('profile_enabled', False))
+
+
+def run_model(model_params: ModelParams, model_packs: np.ndarray = None, model_payroll: np.ndarray = None,
+              model_activations: np.ndarray = None) -> tuple:
+    model_result = model_graph.update(model_params, model_packs, model_payroll, model_activations)
+    return model_result, pnl_frame(model_result, model_params.start)
+
+
+def cached_figure(name: str, key: str, build, *args):
+    return model_cache.get_or_compute(('figure', name, key), lambda: build(*args))
+
+
+def simulation_panel(job_key: tuple, dates: pd.Series):
+    job = job_runner.get(job_key)
+    if job is None:
+        return
+    if job.active:
+        st.progress(job.progress, text=f'Симуляция: {job.progress:.0%}')
+        if st.button('Отменить', key='simulation_cancel'):
+            job.cancel()
+        if not hasattr(st, 'fragment'):
+            st.button('Обновить', key='simulation_refresh')
+    elif job.status == DONE:
+        if st.session_state.get('simulation_refreshing'):
+            # leave the periodic fragment once the job is finished
+            st.session_state.simulation_refreshing = False
+            rerun()
+        sim = job.result
+        sim_dates = dates if len(sim.quantiles[50]) == len(dates) else None
+        st.plotly_chart(charts.simulation_fan(sim.quantiles, sim.draws, sim_dates), use_container_width=True)
+        st.metric(f'Вероятность убытка за {charts.horizon_label(len(sim.quantiles[50]))}',
+                  f'{sim.loss_probability:.1%}')
+    elif job.status == CANCELLED:
+        st.info('Симуляция отменена')
+    elif job.status == FAILED:
+        st.error(f'Симуляция завершилась с ошибкой: {job.error}')
+
 # контейнер с блоком ввода переменных
 container_with_input = st.container()
 drug_section, fte_section, customer_section = container_with_input.columns([1, 2, 2])
@@ -91,6 +216,8 @@ with drug_section:
               help=tm.pack_price_change_help,
               key='pack_price_pharmacy_change')
 
+profiler.lap('inputs: drug')
+
 # FTE section
 with fte_section:
     def create_fte_card(fte_data: dict):
@@ -146,26 +273,30 @@ with fte_section:
             st.slider("Кол-во медицинских представителей", 1, 9, 1, 1,
                       key='medreps_number',
                       help='Выберите количество медицинских представителей в штате')
+    with st.expander('**Штатное расписание**'):
+        roster_file = st.file_uploader('Файл CSV/Parquet: role, salary, headcount, compensation, bonus_quarter, '
+                                       'bonus_year, tax_type, hire_date, exit_date, raise_pct',
+                                       type=['csv', 'parquet'], key='roster_file')
+        roster = None
+        try:
+            if roster_file is not None:
+                roster = load_roster(roster_file, roster_file.name)
+            elif os.environ.get(ROSTER_PATH_ENV):
+                roster = load_roster(os.environ[ROSTER_PATH_ENV])
+        except ValueError as e:
+            st.error(str(e))
+        if roster is not None:
+            st.caption('ФОТ рассчитывается по штатному расписанию вместо карточек FTE')
+
+profiler.lap('inputs: FTE')
 
 # customer section
 with customer_section:
-    columns = ['districts', 'accounts_number']
-    districts_data = [
-        ['ВАО', 14],
-        ['ЗАО', 14],
-        ['САО', 11],
-        ['СВАО', 14],
-        ['СЗАО', 6],
-        ['ЦАО', 10],
-        ['ЮВАО', 24],
-        ['ЮЗАО', 16],
-        ['ЮАО', 20]
-    ]
-
-
-    @st.cache_data
-    def load_districts_data() -> pd.DataFrame:
-        return pd.DataFrame(districts_data, columns=columns)
+    @st.cache_resource
+    def load_districts_data() -> AccountRegistry:
+        # shared read-only registry: st.cache_data would copy tens of thousands of rows on every rerun
+        path = os.environ.get(ACCOUNTS_PATH_ENV)
+        return load_account_registry(path) if path else registry_from_district_counts()
 
 
     districts = load_districts_data()
@@ -173,14 +304,13 @@ with customer_section:
     st.header('B2B-клиенты')
     with st.expander('**Округи Москвы:**'):
         st.multiselect(label=f'**Выберите:**',
-                       options=districts['districts'].tolist(),
-                       default=districts['districts'].tolist(),
+                       options=districts.districts,
+                       default=districts.districts,
                        key='selected_districts')
 
         col1, col2, col3 = st.columns([1, 8, 1])
         with col2:
-            counts_sum = districts.loc[
-                districts['districts'].isin(st.session_state.selected_districts), 'accounts_number'].sum()
+            counts_sum = districts.count(st.session_state.selected_districts)
             st.slider("Активных учреждений в промоции", 1, int(counts_sum), int((counts_sum * 0.1)),
                       key='active_accounts_number',
                       help='Выберите из общего количества учреждений те, которые будут находиться в активной работе')
@@ -220,277 +350,353 @@ with customer_section:
                       key='pack_growth',
                       help='Расчетный прирост продаж со второго квартала, каждый последующий месяц',
                       format='%d%%')
+    with st.expander('**Модель по учреждениям**'):
+        st.checkbox('Рассчитывать упаковки по каждому учреждению', value=False, key='account_mode',
+                    help='Учреждения активируются по убыванию объема, не больше возможностей МП в месяц. '
+                         'Объем, прирост и разгон берутся из реестра учреждений, если они там указаны')
+        st.number_input('Активаций на одного МП в месяц', min_value=1, value=5, step=1,
+                        key='activations_per_rep')
+    with st.expander('**Горизонт планирования**'):
+        st.select_slider('Период расчета', options=list(range(12, 121, 12)), value=12,
+                         format_func=charts.horizon_label, key='horizon_months',
+                         help='Помесячный расчет на 1-10 лет, квартальные и годовые бонусы по календарю')
+        st.number_input('Новых учреждений в год', min_value=0, value=0, step=1,
+                        key='new_accounts_per_year',
+                        help='Добавляются каждый январь со следующего года: разгон продаж, '
+                             'инициация в первые три месяца и поддержание со второго квартала. '
+                             'В модели по учреждениям - следующие по объему учреждения реестра')
+        st.selectbox('Пересчет недельного объема в месяц', VOLUME_CALENDARS, key='volume_calendar',
+                     format_func=volume_calendar_labels.get,
+                     help='Объем за неделю распределяется по дням реального календаря и суммируется по месяцам: '
+                          'по всем дням или по рабочим дням без праздничных дней ТК РФ')
+        seasonality_text = st.text_input('Сезонность по месяцам года, % (12 значений через запятую)', value='',
+                                         key='seasonality_text', help='Январь-декабрь, 100 - без изменений')
+    try:
+        seasonality = tuple(float(i) / 100 for i in seasonality_text.replace(' ', '').split(',') if i)
+    except ValueError:
+        st.error('Сезонность должна быть числами')
+        seasonality = ()
+    if seasonality and len(seasonality) != 12:
+        st.error('Сезонность задается двенадцатью значениями')
+        seasonality = ()
+    st.session_state.seasonality = seasonality
+    horizon_months = st.session_state.horizon_months
+    weeks = weeks_per_month(ModelParams.start, horizon_months, st.session_state.volume_calendar, seasonality)
+
+    profiler.lap('inputs: customers')
+
     # calculation of packs per month
-    packs_per_month = st.session_state.active_accounts_number * st.session_state.patients_per_one_account_per_week * 4
-    packs_jan_to_apr = [int(packs_per_month / 4), int(packs_per_month / 2),
-                        int(packs_per_month / 4 * 3), int(packs_per_month)]
-    packs_apr_to_dec = [
-        int(packs_per_month * (1 + st.session_state.pack_growth / 100) ** i) for i in range(4, 12)
-    ]
-    packs = packs_jan_to_apr + packs_apr_to_dec
+    account_packs = account_activations = None
+    if st.session_state.account_mode:
+        account_inputs = [st.session_state.selected_districts, st.session_state.active_accounts_number,
+                          st.session_state.patients_per_one_account_per_week, st.session_state.pack_growth,
+                          st.session_state.activations_per_rep * st.session_state.medreps_number, horizon_months,
+                          weeks, st.session_state.new_accounts_per_year, ModelParams.start]
+        account_packs, account_activations = model_cache.get_or_compute(
+            ('account_model', districts.key, canonical_hash(account_inputs)),
+            lambda: registry_model(districts.select(account_inputs[0]), *account_inputs[1:]))
+        packs = account_packs
+    else:
+        packs = calc_packs(st.session_state.active_accounts_number,
+                           st.session_state.patients_per_one_account_per_week,
+                           st.session_state.pack_growth, horizon_months,
+                           st.session_state.new_accounts_per_year, weeks=weeks)
 
     with st.container():
-        packs_sum = sum(packs)
+        packs_sum = int(packs.sum())
         sum_a = f"{packs_sum:,}".replace(',', ' ')
-        st.write(f"Всего упаковок за год: {sum_a}")
-
-# calculation of packs per month
-packs_per_month = st.session_state.active_accounts_number * st.session_state.patients_per_one_account_per_week * 4
-packs_jan_to_apr = [int(packs_per_month / 4), int(packs_per_month / 2),
-                    int(packs_per_month / 4 * 3), int(packs_per_month)]
-packs_apr_to_dec = [
-    int(packs_per_month * (1 + st.session_state.pack_growth / 100) ** i) for i in range(4, 12)
-]
-packs = packs_jan_to_apr + packs_apr_to_dec
-
-# make dictionary with FTE salary, bonuses and compensations
-ftes_salary_final = {}
-for fte_role in st.session_state.chosen_fte:
-    fte_shortname = ftes_salary_conditions[fte_role]['shortname']
-    fte_salary_monthly = st.session_state.get(f"{fte_shortname}_salary_gross")
-    fte_tax_type = st.session_state.get(f"{fte_shortname}_tax_type")
-    fte_tax = tax_condition.get(fte_tax_type)
-
-    ftes = 1 if fte_shortname != 'mr' else st.session_state.medreps_number
-    ftes_salary_final[fte_role] = {}
-
-    # salary calculation
-    salary = [fte_salary_monthly / (1 - fte_tax / 100) for i in range(12)]
-    if fte_shortname == 'mr':
-        salary = [i * ftes for i in salary]
-    ftes_salary_final[fte_role]['salary'] = salary
-
-    # compensation calculation
-    compensation_monthly = st.session_state.get(f"{fte_shortname}_compensation") / (1 - fte_tax / 100)
-    compensation = [compensation_monthly * ftes for i in range(12)]
-    ftes_salary_final[fte_role]['compensation'] = compensation
-
-    # quarter bonus calculation
-    quarter_bonus = st.session_state.get(f"{fte_shortname}_quarter_bonus")
-    bonus_quarter = fte_salary_monthly * 3 * (quarter_bonus / 100) / (1 - fte_tax / 100)
-    bonus_quarter_total = []
-    for i in range(12):
-        if i == 2 or i == 5 or i == 8 or i == 11:
-            bonus_quarter_total.append(bonus_quarter * ftes)
-        else:
-            bonus_quarter_total.append(0)
-    ftes_salary_final[fte_role]['bonus_quarter'] = bonus_quarter_total
-
-    # year bonus calculation
-    year_bonus = st.session_state.get(f"{fte_shortname}_year_bonus")
-    bonus_year = fte_salary_monthly * 12 * (year_bonus / 100) / (1 - fte_tax / 100)
-    bonus_year_total = []
-    for i in range(12):
-        if i == 11:
-            bonus_year_total.append(bonus_year * ftes)
-        else:
-            bonus_year_total.append(0)
-    ftes_salary_final[fte_role]['bonus_year'] = bonus_year_total
-
-salary_arr = np.array([0.0])
-compensation_arr = np.array([0] * 12)
-bonus_quarter_arr = np.array([0] * 12)
-bonus_year_arr = np.array([0] * 12)
-
-for i in ftes_salary_final:
-    salary_arr = salary_arr + np.array(ftes_salary_final[i]['salary'])
-    compensation_arr = compensation_arr + np.array(ftes_salary_final[i]['compensation'])
-    bonus_quarter_arr = bonus_quarter_arr + np.array(ftes_salary_final[i]['bonus_quarter'])
-    bonus_year_arr = bonus_year_arr + np.array(ftes_salary_final[i]['bonus_year'])
-
-# calculation of drug cost
-price_cor_coef = (1 + st.session_state.pack_price_pharmacy_change / 100)
-
-revenue_without_VAT_list = [i * st.session_state.pack_price_owner * price_cor_coef for i in packs]
-cogs_without_VAT_list = [i * st.session_state.pack_price_manufacturer for i in packs]
-
-# Customers OPEX
-agency_fee_list = [st.session_state.pack_price_pharmacy * price_cor_coef * i * st.session_state.agency_fee / 100 for i
-                   in packs]
-
-initial_event_total = st.session_state.initial_event * st.session_state.active_accounts_number
-initial_per_month = initial_event_total / 3
-initial_event_OPEX_list = [int(initial_per_month) for i in range(3)] + [0 for i in range(3, 12)]
-
-supporting_OPEX_total = st.session_state.supporting_OPEX * st.session_state.active_accounts_number
-supporting_OPEX_monthly = supporting_OPEX_total / 9
-supporting_OPEX_list = [0 for i in range(3)] + [int(supporting_OPEX_monthly) for i in range(3, 12)]
-
-
-def transform_list(a: list, reverse_sign: bool = True, kilo_view: bool = True) -> list:
-    divider = 1000 if kilo_view else 1
-    return [-int(i / divider) for i in a] if reverse_sign else [int(i / divider) for i in a]
-
-
-df = pd.DataFrame({'date': pd.date_range(start='1/1/2024', freq='M', periods=12),
-                   'packs': transform_list(packs, reverse_sign=False, kilo_view=False),
-                   'revenue': transform_list(revenue_without_VAT_list, reverse_sign=False),
-                   'COGS': transform_list(cogs_without_VAT_list),
-                   'salary': transform_list(salary_arr),
-                   'repr_exp': transform_list(compensation_arr),
-                   'bonus_Q': transform_list(bonus_quarter_arr),
-                   'bonus_Y': transform_list(bonus_year_arr),
-                   'support_fee': transform_list(agency_fee_list),
-                   'initial_event': transform_list(initial_event_OPEX_list),
-                   'supporting_opex': transform_list(supporting_OPEX_list)}
-                  )
-
-df['date'] = df['date'].dt.date
-df['expenses'] = df['COGS'] + df['salary'] + df['repr_exp'] + df['bonus_Q'] \
-                 + df['bonus_Y'] + df['initial_event'] + df['support_fee'] + df['supporting_opex']
-df['profit'] = df['revenue'] + df['expenses']
-df['rolling_profit'] = df['profit'].cumsum()
-
-packs_sum = df['packs'].sum()
-revenue_sum = df['revenue'].sum()
-COGS_sum = df['COGS'].sum()
-salary_sum = df['salary'].sum()
-compensation_sum = df['repr_exp'].sum()
-bonus_quarter_sum = df['bonus_Q'].sum()
-bonus_year_sum = df['bonus_Y'].sum()
-agency_fee_sum = df['support_fee'].sum()
-initial_event_sum = df['initial_event'].sum()
-supporting_opex_sum = df['supporting_opex'].sum()
+        st.write(f"Всего упаковок за {charts.horizon_label(horizon_months)}: {sum_a}")
+    profiler.lap('packs')
+
+# model calculation
+params = ModelParams.from_inputs(st.session_state)
+roster_payroll_total = None
+if roster is not None:
+    roster_key = canonical_hash([roster, params.horizon_months, params.start])
+    roster_payroll_total = model_cache.get_or_compute(
+        ('roster_payroll', roster_key), lambda: roster_payroll(roster, params.horizon_months, params.start))
+    with fte_section:
+        roster_summary = model_cache.get_or_compute(
+            ('roster_summary', roster_key), lambda: role_summary(roster, params.horizon_months, params.start))
+        st.caption('ФОТ по ролям за период, тыс. руб.')
+        st.dataframe(roster_summary.assign(**{i: np.trunc(roster_summary[i] / 1000)
+                                              for i in roster_summary.columns if i != 'headcount'}))
+    profiler.lap('payroll: roster')
+params_key = canonical_hash([params, account_packs, account_activations, roster_payroll_total])
+try:
+    result, df = model_cache.get_or_compute(('model', params_key),
+                                            lambda: run_model(params, account_packs, roster_payroll_total,
+                                                              account_activations))
+except ValueError:
+    st.error('Значения P&L слишком велики: уменьшите прирост упаковок или период расчета')
+    st.stop()
+# the tornado, the simulation and the solver run on the same overrides as the displayed P&L,
+# inputs the overrides fix are left out of them
+analysis_overrides = {'packs': account_packs, 'activations': account_activations, 'payroll': roster_payroll_total}
+fixed_inputs = [*(ACCOUNT_MODEL_INPUTS if st.session_state.account_mode else []),
+                *(roster_fixed_inputs(params) if roster is not None else [])]
+x_labels = charts.month_labels(df['date'])
+profiler.lap('model')
+
 profit_sum = df['profit'].sum()
 
 st.write('---')
 with st.container():
     col1, col2 = st.columns([2, 1])
     with col1:
-        fig = go.Figure(go.Waterfall(
-            name="20", orientation="v",
-            measure=["absolute",
-                     "relative", "relative", "relative", "relative",
-                     "relative", "relative", "relative", "relative",
-                     "total",
-                     ],
-            x=['revenue',
-               'COGS', 'salary', 'repr_exp', 'bonus_Q', 'bonus_Y',
-               'support_fee', 'initial_event', 'supporting_opex', 'profit'],
-            textposition="outside",
-            text=[revenue_sum, COGS_sum, salary_sum, compensation_sum, bonus_quarter_sum, bonus_year_sum,
-                  agency_fee_sum, initial_event_sum, supporting_opex_sum, profit_sum],
-            y=[revenue_sum, COGS_sum, salary_sum, compensation_sum, bonus_quarter_sum, bonus_year_sum,
-               agency_fee_sum, initial_event_sum, supporting_opex_sum, profit_sum],
-            # decreasing={"marker": {"color": "Maroon"}},
-            # increasing={"marker": {"color": "Teal"}},
-            # totals = {"marker":{"color":"red"}} if profit_sum < 0 else {"marker":{"color":"green"}},
-            connector={"line": {"color": "rgb(63, 63, 63)"}},
-        ))
-
         title_dir = "Общая прибыль" if profit_sum > 0 else "Общий убыток"
         sum_a = f"{profit_sum:,}".replace(',', ' ')
         title = f"{title_dir}:   {sum_a} тыс. руб"
         st.subheader(title)
-        min_b = -10000 if profit_sum > 0 else profit_sum * 1.8
-        max_b = revenue_sum * 1.2
-        fig.update_layout(
-            title="P&L 2024",
-            yaxis_range=[min_b, max_b],
-            showlegend=False)
-        st.plotly_chart(fig, use_container_width=True)
+        pnl_tab, sensitivity_tab = st.tabs(['P&L', 'Чувствительность'])
+        with pnl_tab:
+            fig = cached_figure('pnl_waterfall', params_key, charts.pnl_waterfall, df)
+            st.plotly_chart(fig, use_container_width=True)
+            profiler.lap('figure: P&L waterfall')
+        with sensitivity_tab:
+            sensitivity_pct = st.slider('Изменение каждого параметра, ±%', min_value=1, max_value=50, value=10,
+                                        format='%d%%', key='sensitivity_pct')
+            sensitivity = model_cache.get_or_compute(('tornado', params_key, sensitivity_pct),
+                                                     lambda: tornado(params, sensitivity_pct,
+                                                                     sensitivity_inputs(params, fixed_inputs),
+                                                                     **analysis_overrides).iloc[::-1])
+            labels = [input_label(i) for i in sensitivity['input']]
+            fig = cached_figure(f'tornado_{sensitivity_pct}', params_key, charts.tornado_chart,
+                                sensitivity, labels, sensitivity_pct, params.horizon_months)
+            st.plotly_chart(fig, use_container_width=True)
+            profiler.lap('sensitivity')
 
     with col2:
         st.subheader("По месяцам")
-        rev_prof, prof, packs = st.tabs(['Выручка/прибыль', 'Прибыль', 'Упаковки'])
+        rev_prof, prof, packs, simulation = st.tabs(['Выручка/прибыль', 'Прибыль', 'Упаковки', 'Симуляция'])
         with rev_prof:
-
-            profit_list = df['profit'].tolist()
-
-            x = month_name
-
-            fig = go.Figure(go.Bar(x=x, y=profit_list, name='Profit'))
-            fig.add_trace(go.Bar(x=x, y=transform_list(revenue_without_VAT_list, reverse_sign=False), name='Revenue'))
-
-            markers, line = fig.data
-            fig.data = line, markers
-
-            min_a = min(profit_list) * 1, 5
-            max_a = max(revenue_without_VAT_list) * 1, 5
-
-            # fig.update_layout(barmode='stack')
-            fig.update_layout(
-                title="тыс. руб. без НДС",
-                yaxis_range=[min_a, max_a],
-                showlegend=False)
+            fig = cached_figure('revenue_profit_bars', params_key, charts.revenue_profit_bars, df)
             st.plotly_chart(fig, use_container_width=True)
+            profiler.lap('figure: revenue/profit')
         with prof:
-            fig = go.Figure(go.Waterfall(
-                name="20", orientation="v",
-                measure=["relative", "relative", "relative", "relative", "relative", 'relative',
-                         "relative", "relative", "relative", "relative", "relative", "relative"
-                         "total"],
-                x=[*month_name, 'total'],
-                textposition="outside",
-                text=[*df['profit'].tolist(), profit_sum],
-                y=[*df['profit'].tolist(), -profit_sum],
-                # decreasing={"marker": {"color": "Maroon"}},
-                # increasing={"marker": {"color": "Teal"}},
-                # totals = {"marker":{"color":"red"}} if profit_sum < 0 else {"marker":{"color":"green"}},
-                connector={"line": {"color": "rgb(63, 63, 63)"}},
-            ))
-
-            # title_dir = "Общая прибыль" if profit_sum > 0 else "Общий убыток"
-            # sum_a = f"{profit_sum:,}".replace(',', ' ')
-            # title = f"{title_dir}:   {sum_a} тыс. руб"
-            # st.subheader(title)
-
-            fig.update_layout(
-                # title="Прибыль по ме",
-                yaxis_range=[min(df['profit'])*4, max(df['profit'])*4],
-                showlegend=False)
+            fig = cached_figure('monthly_profit_waterfall', params_key, charts.monthly_profit_waterfall, df)
             st.plotly_chart(fig, use_container_width=True)
+            profiler.lap('figure: monthly profit')
         with packs:
-            packs_sum_str = f"{packs_sum:,}".replace(',', ' ')
-            x = month_name
-
-            fig = go.Figure(go.Bar(x=x, y=df['packs'].tolist(), name='Profit',
-                            text = df['packs'].tolist()))
-            # fig.add_trace(go.Bar(x=x, y=transform_list(revenue_without_VAT_list, reverse_sign=False), name='Revenue'))
-
-            # markers, line = fig.data
-            # fig.data = line, markers
-
-            min_a = -100
-            max_a = max(df['packs']) * 1.3
-
-            # fig.update_layout(barmode='stack')
-            fig.update_layout(
-                title=f'Всего упаковок: {packs_sum_str}',
-                yaxis_range=[min_a, max_a],
-                showlegend=False)
+            fig = cached_figure('packs_bars', params_key, charts.packs_bars, df)
             st.plotly_chart(fig, use_container_width=True)
-
+            profiler.lap('figure: packs')
+        with simulation:
+            with st.form('simulation_form'):
+                if st.session_state.account_mode:
+                    st.caption('Упаковки и активации заданы моделью по учреждениям, объем не варьируется')
+                distributions = {}
+                for name, label in simulation_inputs.items():
+                    if name in fixed_inputs:
+                        continue
+                    value = st.session_state[name]
+                    spread = 10 if name == 'pack_price_pharmacy_change' else max(abs(value) * 0.3, 1)
+                    col_kind, col_low, col_high = st.columns([2, 1, 1])
+                    with col_kind:
+                        kind = st.selectbox(label, options=distribution_kinds, key=f'sim_{name}_kind')
+                    with col_low:
+                        low = st.number_input('от', value=float(value - spread), key=f'sim_{name}_low')
+                    with col_high:
+                        high = st.number_input('до', value=float(value + spread), key=f'sim_{name}_high')
+                    clip_low = None if name == 'pack_price_pharmacy_change' else 0
+                    distributions[name] = Distribution(distribution_kinds[kind], min(low, high), max(low, high),
+                                                       mode=value, clip_low=clip_low)
+                col_draws, col_seed = st.columns(2)
+                with col_draws:
+                    draws = st.selectbox('Кол-во прогонов', options=[100_000, 300_000, 1_000_000],
+                                         format_func=lambda i: f"{i:,}".replace(',', ' '))
+                with col_seed:
+                    seed = st.number_input('Seed', min_value=0, value=42, step=1)
+                if st.form_submit_button('Запустить'):
+                    simulation_key = ('monte_carlo', canonical_hash([params_key, distributions, draws, int(seed)]))
+                    job_runner.submit(simulation_key, run_monte_carlo, params, distributions, draws, int(seed),
+                                      **analysis_overrides)
+                    st.session_state.simulation_job = simulation_key
+
+            if 'simulation_job' in st.session_state:
+                simulation_job = job_runner.get(st.session_state.simulation_job)
+                if simulation_job is not None and simulation_job.active and hasattr(st, 'fragment'):
+                    # only the panel reruns while the job is in progress
+                    st.session_state.simulation_refreshing = True
+                    st.fragment(run_every=1)(simulation_panel)(st.session_state.simulation_job, df['date'])
+                else:
+                    st.session_state.simulation_refreshing = False
+                    simulation_panel(st.session_state.simulation_job, df['date'])
+            profiler.lap('simulation')
+
+
+with st.expander('**Портфель SKU**'):
+    sku_file = st.file_uploader('Файл CSV/Parquet: sku и параметры упаковки, например pack_price_owner, '
+                                'pack_price_manufacturer, patients_per_one_account_per_week, pack_growth, weight',
+                                type=['csv', 'parquet'], key='sku_file')
+    sku_list = None
+    try:
+        if sku_file is not None:
+            sku_list = load_portfolio(sku_file, sku_file.name)
+        elif os.environ.get(PORTFOLIO_PATH_ENV):
+            sku_list = load_portfolio(os.environ[PORTFOLIO_PATH_ENV])
+    except ValueError as e:
+        st.error(str(e))
+    if sku_list is not None:
+        col_payroll, col_opex = st.columns(2)
+        with col_payroll:
+            payroll_driver = st.selectbox('Распределение ФОТ', options=list(allocation_drivers),
+                                          format_func=allocation_drivers.get, key='portfolio_payroll_driver')
+        with col_opex:
+            opex_driver = st.selectbox('Распределение OPEX', options=list(allocation_drivers),
+                                       format_func=allocation_drivers.get, key='portfolio_opex_driver')
+        # per-session model, only SKUs whose rows changed are recomputed
+        if 'portfolio_model' not in st.session_state:
+            st.session_state.portfolio_model = PortfolioModel()
+        try:
+            portfolio = st.session_state.portfolio_model.update(
+                sku_list, params, roster_payroll_total, {'payroll': payroll_driver, 'opex': opex_driver},
+                account_activations)
+        except ValueError as e:
+            st.error(str(e))
+            portfolio = None
+        if portfolio is not None:
+            try:
+                total_frame, summary = pnl_frame(portfolio.total, params.start), sku_summary(portfolio)
+            except ValueError:
+                st.error('Значения P&L портфеля слишком велики: уменьшите прирост упаковок или период расчета')
+                portfolio = None
+        if portfolio is not None:
+            col_total, col_sku = st.columns(2)
+            with col_total:
+                st.plotly_chart(charts.pnl_waterfall(total_frame), use_container_width=True)
+            with col_sku:
+                chosen_sku = st.selectbox('SKU', options=portfolio.skus.tolist(), key='portfolio_sku')
+                st.plotly_chart(charts.pnl_waterfall(pnl_frame(sku_result(portfolio, chosen_sku), params.start)),
+                                use_container_width=True)
+            st.dataframe(summary)
+            st.caption(f'Пересчитано SKU: {len(st.session_state.portfolio_model.recomputed)} из {len(portfolio.skus)}')
+            if st.session_state.account_mode:
+                st.caption('OPEX портфеля - по активациям модели по учреждениям, упаковки SKU - по параметрам SKU')
+
+profiler.lap('portfolio')
+
+with st.expander('**Точка безубыточности и подбор параметра**'):
+    month_break_even = int(break_even_month(result))
+    st.write(f"Месяц безубыточности: {x_labels[month_break_even] if month_break_even >= 0 else 'не достигается'}")
+
+    col_input, col_targets = st.columns([1, 1])
+    with col_input:
+        solver_input = st.selectbox('Параметр', options=list(solvable_inputs(params, fixed_inputs)),
+                                    format_func=input_label, key='solver_input')
+    with col_targets:
+        solver_targets = st.text_input(f'Целевая прибыль за {charts.horizon_label(params.horizon_months)}, '
+                                       'тыс. руб. (через запятую)', value='0',
+                                       key='solver_targets')
+    try:
+        targets = [float(i) for i in solver_targets.replace(' ', '').split(',') if i]
+    except ValueError:
+        st.error('Целевая прибыль должна быть числом')
+        targets = []
+    if targets:
+        values = solve(params, solver_input, [i * 1000 for i in targets], **analysis_overrides)
+        solution = pd.DataFrame({'Прибыль, тыс. руб.': targets, 'Значение': values})
+        if solver_input in integer_inputs:
+            solution['Значение'] = np.ceil(solution['Значение'])
+        st.dataframe(solution)
+
+profiler.lap('solver')
+
+with st.expander('**Сохраненные сценарии**'):
+    model_inputs = {'chosen_fte': [fte.role for fte in params.ftes], **flat_inputs(params)}
+    col_name, col_tag, col_save = st.columns([2, 2, 1])
+    with col_name:
+        scenario_name = st.text_input('Название сценария', key='scenario_name')
+    with col_tag:
+        scenario_tag = st.text_input('Тег', key='scenario_tag')
+    with col_save:
+        if st.button('Сохранить', disabled=not scenario_name.strip()):
+            scenario_store.save(scenario_name.strip(), model_inputs, result, params.start, scenario_tag.strip())
+
+    tag_filter = st.selectbox('Фильтр по тегу', options=['', *scenario_store.tags()], key='scenario_tag_filter',
+                              format_func=lambda i: i or 'все')
+    catalog = scenario_store.catalog(tag_filter)
+    st.dataframe(catalog.set_index('name'))
+    compared = st.multiselect('Сравнить', options=catalog['name'].tolist(), key='compared_scenarios')
+    scenario_batch = None
+    if compared:
+        baseline = st.selectbox('Базовый сценарий', options=compared, key='baseline_scenario')
+        try:
+            saved_inputs, stacked = scenario_store.load(compared)
+        except ValueError:
+            st.error('Часть сценариев сохранена другой версией модели, удалите и сохраните их заново')
+            saved_inputs = None
+    if compared and saved_inputs is not None:
+        names = list(saved_inputs)
+        scenario_batch = scenario_batch_frame(saved_inputs, stacked)
+        st.dataframe(comparison_frame(names, stacked, names.index(baseline)))
+        st.plotly_chart(charts.scenario_lines(names, rolling_profit(stacked)), use_container_width=True)
+        changed = pd.DataFrame(saved_inputs).astype(str)
+        st.dataframe(changed[changed.nunique(axis=1) > 1])
+        if st.button('Удалить выбранные'):
+            scenario_store.delete(compared)
+            rerun()
+
+profiler.lap('scenarios')
 
 st.write('---')
 st.header('Исходные данные. Суммы указаны в тыс. рублей')
 
-# df.loc['Column_Total']= df.sum(numeric_only=True, axis=0)
-
-
-df.loc[df.shape[0]] = [np.nan for col_num in range(1, df.shape[1] + 1)]
-df.iloc[df.shape[0] - 1,
-        [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]] = df.iloc[:, [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]].sum(axis=0)
-df.at[12, 'rolling_profit'] = ''
-df.at[12, 'date'] = 'Итого'
-df = df.set_index('date')
+# the monthly table keeps its int64/datetime64 dtypes, totals are a separate one-row frame below it
+table = df.set_index('date')
+totals = pnl_totals(df).to_frame('Итого').T
+table_options = {}
+if hasattr(st, 'column_config'):
+    table_options['column_config'] = {'_index': st.column_config.DateColumn('date', format='YYYY-MM-DD')}
+pages = -(-len(table) // TABLE_PAGE_ROWS)
+page = 1
+if pages > 1:
+    page = st.number_input(f'Страница (по {TABLE_PAGE_ROWS} мес.)', min_value=1, max_value=pages, value=1,
+                           key='table_page')
+profiler.lap('table: build')
 # df.columns = ['дата', 'выручка', 'COGS', 'оклад', 'предст.расх.', 'бонус кв.', 'бонус год',
 #                'поддерж. OPEX', 'initial_event', 'supporting_opex', 'прибыль', 'прибыль_']
 
-st.write(df)
-
-buffer = io.BytesIO()
+st.dataframe(table.iloc[(page - 1) * TABLE_PAGE_ROWS:page * TABLE_PAGE_ROWS], **table_options)
+st.dataframe(totals)
+profiler.lap('table: st.dataframe')
 
-with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-    # Write each dataframe to a different worksheet.
-    df.to_excel(writer, sheet_name='Sheet1')
-
-    # Close the Pandas Excel writer and output the Excel file to the buffer
-    # writer.close()
-
-st.download_button(
-    label="Download Excel worksheets",
-    data=buffer,
-    file_name="Model.xlsx",
-    mime="application/vnd.ms-excel"
-)
+# the workbook is built only on request and cached by the hash of the model output
+export_sheets = {
+    'Inputs': export.inputs_frame(model_inputs),
+    'P&L': df,
+    'P&L totals': totals.reset_index(names='period'),
+    'Sensitivity': sensitivity.iloc[::-1],
+}
+if scenario_batch is not None:
+    # the saved scenarios chosen for comparison, one row per scenario and month
+    export_sheets['Scenarios'] = scenario_batch
+export_key = ('xlsx', canonical_hash(export_sheets))
+xlsx = model_cache.get(export_key)
+if xlsx is None and st.button('Подготовить Excel'):
+    xlsx = model_cache.get_or_compute(export_key, lambda: export.workbook_bytes(export_sheets))
+if xlsx is not None:
+    st.download_button(
+        label="Download Excel worksheets",
+        data=xlsx,
+        file_name="Model.xlsx",
+        mime="application/vnd.ms-excel"
+    )
+profiler.lap('excel')
+
+cache_stats = model_cache.stats()
+st.caption(f"Кэш модели: {cache_stats['size']}/{cache_stats['maxsize']}, "
+           f"попаданий {cache_stats['hits']}, промахов {cache_stats['misses']}, "
+           f"вытеснено {cache_stats['evictions']}")
+job_stats = job_runner.stats()
+st.caption(f"Фоновые задачи: выполняется {job_stats['running']}, в очереди {job_stats['pending']}, "
+           f"готово {job_stats['done']}")
+st.caption(f"Пересчитано узлов модели: {', '.join(model_graph.recomputed) or 'нет'}")
+profiler.end_run()
+
+with st.sidebar.expander('Профилирование'):
+    st.checkbox('Замерять этапы перезапуска', value=profile_requested(), key='profile_enabled')
+    if profiler.samples:
+        st.dataframe(profiler.summary().round(2))
+        st.download_button('Скачать замеры JSON', data=profiler.to_json(), file_name='profile.json',
+                           mime='application/json')
@@ -0,0 +1,428 @@
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Mapping
+
+import numpy as np
+import pandas as pd
+
+from volume import weeks_per_month
+
+ftes_salary_conditions = {
+    'MedRep': {
+        'salary': 100000,
+        'tax_index': 0,
+        'fullname': 'Medical Representative',
+        'fullname_rus': 'Медицинский представитель',
+        'shortname': 'mr',
+        'bonus_quarter': 20,
+        'bonus_year': 30,
+        'compensation': 25000,
+    },
+    'ProdMan': {
+        'salary': 1,
+        'tax_index': 0,
+        'fullname': 'Product Manager',
+        'fullname_rus': 'Продакт Менеджер',
+        'shortname': 'pm',
+        'bonus_quarter': 1,
+        'bonus_year': 1,
+        'compensation': 1,
+    },
+    'ComDir': {
+        'salary': 1,
+        'tax_index': 0,
+        'fullname': 'Commercial Director',
+        'fullname_rus': 'Коммерческий директор',
+        'shortname': 'cd',
+        'bonus_quarter': 1,
+        'bonus_year': 1,
+        'compensation': 1,
+    },
+}
+
+tax_condition = {
+    'ФизЛицо': 15,
+    'ЮрЛицо': 0,
+}
+
+default_fte = ['MedRep']
+
+MONTHS = 12
+START = '2024-01'
+
+# P&L line items in the order they appear in the output table
+PNL_COLUMNS = ['packs', 'revenue', 'COGS', 'salary', 'repr_exp', 'bonus_Q', 'bonus_Y',
+               'support_fee', 'initial_event', 'supporting_opex']
+EXPENSE_COLUMNS = PNL_COLUMNS[2:]
+# P&L column -> ModelResult field
+COLUMN_FIELDS = dict(zip(PNL_COLUMNS, ['packs', 'revenue', 'cogs', 'salary', 'compensation', 'bonus_quarter',
+                                       'bonus_year', 'support_fee', 'initial_event', 'supporting_opex']))
+# payroll components, the order of a (component, months) payroll array
+PAYROLL_FIELDS = ('salary', 'compensation', 'bonus_quarter', 'bonus_year')
+# largest P&L value: the int64 columns are summed over line items and up to 120 months,
+# so values are kept 4096 times below the int64 range
+PNL_LIMIT = float(2 ** 51)
+
+# widget key suffix of an FTE card -> FteParams field, e.g. 'mr_quarter_bonus' -> bonus_quarter
+FTE_INPUTS = {
+    'salary_gross': 'salary',
+    'compensation': 'compensation',
+    'quarter_bonus': 'bonus_quarter',
+    'year_bonus': 'bonus_year',
+}
+
+
+@dataclass(frozen=True)
+class FteParams:
+    role: str
+    shortname: str
+    salary: float
+    compensation: float
+    bonus_quarter: float
+    bonus_year: float
+    tax: float
+
+
+@dataclass(frozen=True)
+class ModelParams:
+    pack_price_pharmacy: float = 5000
+    pack_price_owner: float = 3500
+    pack_price_manufacturer: float = 1500
+    pack_price_pharmacy_change: float = 0
+    active_accounts_number: float = 12
+    patients_per_one_account_per_week: float = 4
+    pack_growth: float = 10
+    agency_fee: float = 10
+    initial_event: float = 150000
+    supporting_OPEX: float = 30000
+    medreps_number: float = 1
+    new_accounts_per_year: float = 0
+    horizon_months: int = MONTHS
+    start: str = START
+    volume_calendar: str = 'flat'
+    seasonality: tuple = ()
+    ftes: tuple = ()
+
+    @classmethod
+    def from_inputs(cls, inputs: Mapping) -> 'ModelParams':
+        """Build parameters from widget values keyed like st.session_state, missing keys fall back to defaults"""
+        values = {name: inputs[name] for name in cls.__dataclass_fields__ if name != 'ftes' and name in inputs}
+        ftes = tuple(fte_from_inputs(role, inputs) for role in inputs.get('chosen_fte', default_fte))
+        return cls(**values, ftes=ftes)
+
+
+def tax_percent(tax_type):
+    """Tax percent of a tax_condition name or of an array of names"""
+    if isinstance(tax_type, str):
+        return tax_condition[tax_type]
+    return pd.Series(np.asarray(tax_type)).map(tax_condition).to_numpy(dtype=float)
+
+
+def fte_from_inputs(role: str, inputs: Mapping) -> FteParams:
+    conditions = ftes_salary_conditions[role]
+    shortname = conditions['shortname']
+    tax_type = inputs.get(f'{shortname}_tax_type', list(tax_condition)[conditions['tax_index']])
+    values = {field: inputs.get(f'{shortname}_{suffix}', conditions[field])
+              for suffix, field in FTE_INPUTS.items()}
+    return FteParams(role=role, shortname=shortname, tax=tax_percent(tax_type), **values)
+
+
+def with_inputs(params: ModelParams, inputs: Mapping) -> ModelParams:
+    """Copy of params with values replaced by widget-named inputs, scalars or arrays of shape (N,)"""
+    fields = {name: value for name, value in inputs.items() if name in params.__dataclass_fields__ and name != 'ftes'}
+    ftes = []
+    for fte in params.ftes:
+        values = {field: inputs[f'{fte.shortname}_{suffix}'] for suffix, field in FTE_INPUTS.items()
+                  if f'{fte.shortname}_{suffix}' in inputs}
+        if f'{fte.shortname}_tax_type' in inputs:
+            values['tax'] = tax_percent(inputs[f'{fte.shortname}_tax_type'])
+        ftes.append(replace(fte, **values))
+    unknown = set(inputs) - set(fields) - {f'{fte.shortname}_{suffix}' for fte in params.ftes
+                                           for suffix in [*FTE_INPUTS, 'tax_type']}
+    if unknown:
+        raise KeyError(f'Unknown model inputs: {sorted(unknown)}')
+    return replace(params, **fields, ftes=tuple(ftes))
+
+
+def flat_inputs(params: ModelParams) -> dict:
+    """Widget-named numeric inputs of params, FTE tax as '<shortname>_tax' percent"""
+    inputs = {name: getattr(params, name) for name in params.__dataclass_fields__ if name != 'ftes'}
+    for fte in params.ftes:
+        inputs.update({f'{fte.shortname}_{suffix}': getattr(fte, field) for suffix, field in FTE_INPUTS.items()})
+        inputs[f'{fte.shortname}_tax'] = fte.tax
+    return inputs
+
+
+def input_value(params: ModelParams, name: str):
+    """Value of a widget-named numeric input, e.g. 'agency_fee' or 'mr_salary_gross'"""
+    if name in params.__dataclass_fields__ and name != 'ftes':
+        return getattr(params, name)
+    for fte in params.ftes:
+        shortname, _, suffix = name.partition('_')
+        if shortname == fte.shortname and suffix in FTE_INPUTS:
+            return getattr(fte, FTE_INPUTS[suffix])
+    raise KeyError(f'Unknown model input: {name}')
+
+
+@dataclass(frozen=True)
+class ModelResult:
+    packs: np.ndarray
+    revenue: np.ndarray
+    cogs: np.ndarray
+    salary: np.ndarray
+    compensation: np.ndarray
+    bonus_quarter: np.ndarray
+    bonus_year: np.ndarray
+    support_fee: np.ndarray
+    initial_event: np.ndarray
+    supporting_opex: np.ndarray
+
+    @property
+    def expenses(self) -> np.ndarray:
+        return (self.cogs + self.salary + self.compensation + self.bonus_quarter + self.bonus_year
+                + self.support_fee + self.initial_event + self.supporting_opex)
+
+    @property
+    def profit(self) -> np.ndarray:
+        return self.revenue - self.expenses
+
+    @property
+    def rolling_profit(self) -> np.ndarray:
+        return np.cumsum(self.profit, axis=-1)
+
+
+def _col(value) -> np.ndarray:
+    # scalars and (N,) scenario arrays as a column broadcasting against the month axis
+    return np.asarray(value, dtype=float)[..., None]
+
+
+@lru_cache(maxsize=64)
+def calendar(start: str = START, months: int = MONTHS) -> tuple:
+    """Month of year (1-12) and calendar year counted from the start year of every month of the horizon"""
+    absolute = (np.datetime64(start, 'M') + np.arange(months)).astype(np.int64)
+    month_of_year = absolute % 12 + 1
+    year = absolute // 12 - absolute[0] // 12
+    for values in (month_of_year, year):
+        values.setflags(write=False)
+    return month_of_year, year
+
+
+def cohort_starts(start: str = START, months: int = MONTHS) -> np.ndarray:
+    """First month of every account cohort: the horizon start, then January of each following year"""
+    _, year = calendar(start, months)
+    return np.concatenate([[0], np.flatnonzero(np.diff(year)) + 1])
+
+
+def calc_packs(accounts, packs_per_week, growth, months: int = MONTHS, new_accounts=0,
+               start: str = START, weeks=4) -> np.ndarray:
+    # 25%, 50%, 75%, 100% during the first four months of a cohort, then compounding month-to-month growth;
+    # weeks is the flat 4 or the (months,) weeks of volume of every calendar month, see volume.weeks_per_month
+    age = np.arange(months)
+    factor = np.where(age < 4, (age + 1) / 4, (1 + _col(growth) / 100) ** age)
+    packs = _col(accounts) * _col(packs_per_week) * weeks * factor
+    # accounts added each year repeat the curve from their first January, in the weeks of their own months
+    offsets = cohort_starts(start, months)[1:]
+    if len(offsets):
+        cohort = _col(new_accounts) * _col(packs_per_week) * factor
+        packs = np.array(np.broadcast_to(packs, np.broadcast_shapes(packs.shape, cohort.shape)))
+        weeks = np.broadcast_to(weeks, (months,))
+        for offset in offsets:
+            packs[..., offset:] += cohort[..., :months - offset] * weeks[offset:]
+    return np.trunc(packs)
+
+
+def calc_revenue(packs: np.ndarray, price_owner, price_change) -> np.ndarray:
+    return packs * _col(price_owner) * (1 + _col(price_change) / 100)
+
+
+def calc_cogs(packs: np.ndarray, price_manufacturer) -> np.ndarray:
+    return packs * _col(price_manufacturer)
+
+
+def calc_support_fee(packs: np.ndarray, price_pharmacy, price_change, agency_fee) -> np.ndarray:
+    return _col(price_pharmacy) * (1 + _col(price_change) / 100) * packs * _col(agency_fee) / 100
+
+
+def calc_initial_event(initial_event, accounts, months: int = MONTHS, new_accounts=0,
+                       start: str = START) -> np.ndarray:
+    # spread over the first three months of every cohort, once per account
+    starts = cohort_starts(start, months)
+    age = np.arange(months) - starts[:, None]
+    cohort = (age >= 0) & (age < 3)
+    first = np.trunc(_col(initial_event) * _col(accounts) / 3) * cohort[0]
+    added = np.trunc(_col(initial_event) * _col(new_accounts) / 3) * cohort[1:].any(axis=0)
+    return first + added
+
+
+def calc_supporting_opex(supporting_opex, accounts, months: int = MONTHS, new_accounts=0,
+                         start: str = START) -> np.ndarray:
+    # spread over Q2-Q4 of every year for all accounts added by that year
+    month_of_year, year = calendar(start, months)
+    per_month = np.trunc(_col(supporting_opex) * (_col(accounts) + _col(new_accounts) * year) / 9)
+    return np.where(month_of_year > 3, per_month, 0.0)
+
+
+def calc_account_initial_event(initial_event, activations: np.ndarray) -> np.ndarray:
+    # (months,) accounts activated per month, each initiation spread over its first three months
+    initiating = np.convolve(activations, np.ones(3))[:len(activations)]
+    return np.trunc(_col(initial_event) * initiating / 3)
+
+
+def calc_account_supporting_opex(supporting_opex, activations: np.ndarray, months: int = MONTHS,
+                                 start: str = START) -> np.ndarray:
+    # spread over Q2-Q4 of every year for all accounts activated by the month
+    month_of_year, _ = calendar(start, months)
+    per_month = np.trunc(_col(supporting_opex) * np.cumsum(activations) / 9)
+    return np.where(month_of_year > 3, per_month, 0.0)
+
+
+def _fte_count(shortname: str, medreps_number):
+    return _col(medreps_number) if shortname == 'mr' else 1
+
+
+def calc_fte_salary(shortname: str, salary, tax, medreps_number, months: int = MONTHS,
+                    start: str = START) -> np.ndarray:
+    return _col(salary) / (1 - _col(tax) / 100) * _fte_count(shortname, medreps_number) * np.ones(months)
+
+
+def calc_fte_compensation(shortname: str, compensation, tax, medreps_number, months: int = MONTHS,
+                          start: str = START) -> np.ndarray:
+    return _col(compensation) / (1 - _col(tax) / 100) * _fte_count(shortname, medreps_number) * np.ones(months)
+
+
+def calc_fte_bonus_quarter(shortname: str, salary, bonus_quarter, tax, medreps_number, months: int = MONTHS,
+                           start: str = START) -> np.ndarray:
+    ftes = _fte_count(shortname, medreps_number)
+    bonus = _col(salary) * 3 * (_col(bonus_quarter) / 100) / (1 - _col(tax) / 100) * ftes
+    month_of_year, _ = calendar(start, months)
+    return np.where(month_of_year % 3 == 0, bonus, 0.0)
+
+
+def calc_fte_bonus_year(shortname: str, salary, bonus_year, tax, medreps_number, months: int = MONTHS,
+                        start: str = START) -> np.ndarray:
+    ftes = _fte_count(shortname, medreps_number)
+    bonus = _col(salary) * 12 * (_col(bonus_year) / 100) / (1 - _col(tax) / 100) * ftes
+    month_of_year, _ = calendar(start, months)
+    return np.where(month_of_year == 12, bonus, 0.0)
+
+
+def calc_fte_payroll(fte: FteParams, medreps_number, months: int = MONTHS, start: str = START) -> dict:
+    return {
+        'salary': calc_fte_salary(fte.shortname, fte.salary, fte.tax, medreps_number, months, start),
+        'compensation': calc_fte_compensation(fte.shortname, fte.compensation, fte.tax, medreps_number, months,
+                                              start),
+        'bonus_quarter': calc_fte_bonus_quarter(fte.shortname, fte.salary, fte.bonus_quarter, fte.tax,
+                                                medreps_number, months, start),
+        'bonus_year': calc_fte_bonus_year(fte.shortname, fte.salary, fte.bonus_year, fte.tax, medreps_number,
+                                          months, start),
+    }
+
+
+def calc_payroll(ftes: tuple, medreps_number, months: int = MONTHS, start: str = START) -> dict:
+    payroll = {name: np.zeros(months) for name in PAYROLL_FIELDS}
+    for fte in ftes:
+        for name, values in calc_fte_payroll(fte, medreps_number, months, start).items():
+            payroll[name] = payroll[name] + values
+    return payroll
+
+
+def compute(params: ModelParams, packs: np.ndarray = None, payroll: np.ndarray = None,
+            activations: np.ndarray = None) -> ModelResult:
+    """Monthly model arrays, (months,) for scalar params or (N, months) when any input is an (N,) scenario array.
+
+    packs replaces the ramp-up of calc_packs, e.g. with volumes of an account-level model, and a
+    (component, months) payroll in PAYROLL_FIELDS order replaces the FTE cards, e.g. with a staff roster.
+    (months,) activations, the accounts activated in every month, time the initiation and support OPEX
+    instead of the yearly cohorts."""
+    months, start = params.horizon_months, params.start
+    if packs is None:
+        packs = calc_packs(params.active_accounts_number, params.patients_per_one_account_per_week,
+                           params.pack_growth, months, params.new_accounts_per_year, start,
+                           weeks_per_month(start, months, params.volume_calendar, params.seasonality))
+    if activations is None:
+        opex = dict(
+            initial_event=calc_initial_event(params.initial_event, params.active_accounts_number, months,
+                                             params.new_accounts_per_year, start),
+            supporting_opex=calc_supporting_opex(params.supporting_OPEX, params.active_accounts_number, months,
+                                                 params.new_accounts_per_year, start),
+        )
+    else:
+        opex = dict(
+            initial_event=calc_account_initial_event(params.initial_event, activations),
+            supporting_opex=calc_account_supporting_opex(params.supporting_OPEX, activations, months, start),
+        )
+    items = dict(
+        packs=packs,
+        revenue=calc_revenue(packs, params.pack_price_owner, params.pack_price_pharmacy_change),
+        cogs=calc_cogs(packs, params.pack_price_manufacturer),
+        support_fee=calc_support_fee(packs, params.pack_price_pharmacy, params.pack_price_pharmacy_change,
+                                     params.agency_fee),
+        **opex,
+        **(calc_payroll(params.ftes, params.medreps_number, months, start) if payroll is None
+           else dict(zip(PAYROLL_FIELDS, payroll))),
+    )
+    return make_result(items)
+
+
+def make_result(items: dict) -> ModelResult:
+    """ModelResult from line item arrays keyed by ModelResult field, broadcast to a common shape"""
+    shape = np.broadcast_shapes(*(values.shape for values in items.values()))
+    return ModelResult(**{name: np.broadcast_to(values, shape) for name, values in items.items()})
+
+
+def compute_batch(base: ModelParams, scenarios: Mapping, **overrides) -> ModelResult:
+    """Evaluate (N,) arrays of widget-named inputs on top of base in one broadcasting pass, outputs are (N, months).
+
+    overrides are the packs, payroll and activations of compute, shared by all scenarios"""
+    return compute(with_inputs(base, scenarios), **overrides)
+
+
+def month_end_dates(start: str = START, months: int = MONTHS) -> np.ndarray:
+    first = np.datetime64(start, 'M') + np.arange(months)
+    return (first + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')
+
+
+def transform_array(a: np.ndarray, reverse_sign: bool = True, kilo_view: bool = True) -> np.ndarray:
+    divider = 1000 if kilo_view else 1
+    values = np.trunc(np.asarray(a) / divider)
+    # a compounding growth over a long horizon can leave the int64 range, the cast would wrap it silently
+    if not np.all(np.abs(values) < PNL_LIMIT):
+        raise ValueError('P&L values are too large for the int64 columns, lower the growth or the horizon')
+    values = values.astype(np.int64)
+    return -values if reverse_sign else values
+
+
+def _line_items(result: ModelResult) -> dict:
+    # P&L columns in thousands of rubles, expenses with negative sign, flattened scenario by scenario
+    return {'packs': transform_array(result.packs, reverse_sign=False, kilo_view=False).ravel(),
+            'revenue': transform_array(result.revenue, reverse_sign=False).ravel(),
+            **{column: transform_array(getattr(result, COLUMN_FIELDS[column])).ravel()
+               for column in EXPENSE_COLUMNS}}
+
+
+def pnl_frame(result: ModelResult, start: str = START) -> pd.DataFrame:
+    """Monthly P&L in thousands of rubles, expenses with negative sign"""
+    df = pd.DataFrame({'date': pd.to_datetime(month_end_dates(start, result.packs.shape[-1])),
+                       **_line_items(result)})
+    df['expenses'] = df[EXPENSE_COLUMNS].sum(axis=1)
+    df['profit'] = df['revenue'] + df['expenses']
+    df['rolling_profit'] = df['profit'].cumsum()
+    return df
+
+
+def pnl_totals(df: pd.DataFrame) -> pd.Series:
+    """Column totals of a pnl_frame, rolling_profit has no meaningful total and is left out"""
+    return df[[*PNL_COLUMNS, 'expenses', 'profit']].sum(axis=0)
+
+
+def batch_frame(result: ModelResult, start: str = START, scenario_ids=None) -> pd.DataFrame:
+    """P&L of an (N, months) scenario batch in long form, one row per scenario and month, units of pnl_frame"""
+    scenarios, months = result.packs.shape
+    scenario_ids = np.arange(scenarios) if scenario_ids is None else np.asarray(scenario_ids)
+    df = pd.DataFrame({'scenario': np.repeat(scenario_ids, months),
+                       'date': pd.to_datetime(np.tile(month_end_dates(start, months), scenarios)),
+                       **_line_items(result)})
+    df['expenses'] = df[EXPENSE_COLUMNS].sum(axis=1)
+    df['profit'] = df['revenue'] + df['expenses']
+    df['rolling_profit'] = df['profit'].to_numpy().reshape(scenarios, months).cumsum(axis=1).ravel()
+    return df
@@ -0,0 +1,56 @@
+import io
+from typing import Mapping
+
+import pandas as pd
+import xlsxwriter
+
+ROWS_PER_CHUNK = 10_000
+# rows of an xlsx worksheet, the header included
+MAX_ROWS = 1_048_576
+
+
+def inputs_frame(inputs: Mapping) -> pd.DataFrame:
+    return pd.DataFrame({'input': list(inputs), 'value': [str(i) if isinstance(i, (list, tuple)) else i
+                                                          for i in inputs.values()]})
+
+
+def check_rows(name: str, rows: int):
+    if rows + 1 > MAX_ROWS:
+        raise ValueError(f'Sheet {name}: {rows:,} rows do not fit into the {MAX_ROWS - 1:,} data rows '
+                         f'of an xlsx worksheet, use Parquet or CSV')
+
+
+def write_frame(worksheet, df: pd.DataFrame):
+    """Write df row by row in order, as constant_memory mode requires"""
+    check_rows(worksheet.name, len(df))
+    worksheet.write_row(0, 0, [str(i) for i in df.columns])
+    row = 1
+    for start in range(0, len(df), ROWS_PER_CHUNK):
+        # materialize python values one chunk at a time
+        for values in df.iloc[start:start + ROWS_PER_CHUNK].itertuples(index=False, name=None):
+            if worksheet.write_row(row, 0, values) == -1:
+                raise ValueError(f'Sheet {worksheet.name}: row {row + 1:,} is outside of the worksheet')
+            row += 1
+    worksheet.freeze_panes(1, 0)
+
+
+def write_workbook(target, sheets: Mapping) -> None:
+    """Write sheet name -> DataFrame to an xlsx path or file object, streaming rows in constant_memory mode.
+
+    Raises ValueError before anything is written when a frame has more rows than a worksheet."""
+    for name, df in sheets.items():
+        check_rows(name, len(df))
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': True,
+                                            'default_date_format': 'yyyy-mm-dd',
+                                            'nan_inf_to_errors': True})
+    try:
+        for name, df in sheets.items():
+            write_frame(workbook.add_worksheet(name[:31]), df)
+    finally:
+        workbook.close()
+
+
+def workbook_bytes(sheets: Mapping) -> bytes:
+    buffer = io.BytesIO()
+    write_workbook(buffer, sheets)
+    return buffer.getvalue()
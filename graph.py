@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from engine import (COLUMN_FIELDS, EXPENSE_COLUMNS, ModelParams, ModelResult, calc_account_initial_event,
+                    calc_account_supporting_opex, calc_cogs, calc_fte_bonus_quarter, calc_fte_bonus_year,
+                    calc_fte_compensation, calc_fte_salary, calc_initial_event, calc_packs, calc_revenue,
+                    calc_support_fee, calc_supporting_opex, flat_inputs, make_result)
+from volume import weeks_per_month
+
+PAYROLL_COLUMNS = ['salary', 'repr_exp', 'bonus_Q', 'bonus_Y']
+
+
+@dataclass(frozen=True)
+class Node:
+    """Line item computed as func(*input values, *dependency values)"""
+    name: str
+    func: Callable
+    inputs: tuple = ()
+    deps: tuple = ()
+
+
+# calendar inputs of every node with a monthly profile
+HORIZON = ('horizon_months', 'start')
+
+
+def _sum(months: int, start: str, *values) -> np.ndarray:
+    return sum(values, np.zeros(months))
+
+
+def _payroll_total(component: int):
+    # sum of the FTE cards unless a (component, months) roster payroll replaces them
+    return lambda months, start, payroll, *values: _sum(months, start, *values) if payroll is None \
+        else payroll[component]
+
+
+def _fte_nodes(role: str, shortname: str) -> list:
+    # only medical representatives scale with medreps_number
+    medreps = ('medreps_number',) if shortname == 'mr' else ()
+
+    def node(column: str, func: Callable, *names: str) -> Node:
+        if medreps:
+            return Node(f'{role}.{column}', lambda *args: func(shortname, *args), (*names, *medreps, *HORIZON))
+        return Node(f'{role}.{column}', lambda *args: func(shortname, *args[:-2], 1, *args[-2:]),
+                    (*names, *HORIZON))
+
+    salary, tax = f'{shortname}_salary_gross', f'{shortname}_tax'
+    return [
+        node('salary', calc_fte_salary, salary, tax),
+        node('repr_exp', calc_fte_compensation, f'{shortname}_compensation', tax),
+        node('bonus_Q', calc_fte_bonus_quarter, salary, f'{shortname}_quarter_bonus', tax),
+        node('bonus_Y', calc_fte_bonus_year, salary, f'{shortname}_year_bonus', tax),
+    ]
+
+
+def build_nodes(params: ModelParams) -> list:
+    """Nodes of the P&L in topological order, one payroll node per FTE card and component"""
+    nodes = [
+        Node('packs', lambda accounts, per_week, growth, new, months, start, volume_calendar, seasonality, packs:
+             calc_packs(accounts, per_week, growth, months, new, start,
+                        weeks_per_month(start, months, volume_calendar, seasonality)) if packs is None else packs,
+             ('active_accounts_number', 'patients_per_one_account_per_week', 'pack_growth', 'new_accounts_per_year',
+              *HORIZON, 'volume_calendar', 'seasonality', 'packs')),
+        Node('revenue', lambda price, change, packs: calc_revenue(packs, price, change),
+             ('pack_price_owner', 'pack_price_pharmacy_change'), ('packs',)),
+        Node('COGS', lambda price, packs: calc_cogs(packs, price), ('pack_price_manufacturer',), ('packs',)),
+        Node('support_fee', lambda price, change, fee, packs: calc_support_fee(packs, price, change, fee),
+             ('pack_price_pharmacy', 'pack_price_pharmacy_change', 'agency_fee'), ('packs',)),
+        Node('initial_event', lambda value, accounts, new, months, start, activations:
+             calc_initial_event(value, accounts, months, new, start) if activations is None
+             else calc_account_initial_event(value, activations),
+             ('initial_event', 'active_accounts_number', 'new_accounts_per_year', *HORIZON, 'activations')),
+        Node('supporting_opex', lambda value, accounts, new, months, start, activations:
+             calc_supporting_opex(value, accounts, months, new, start) if activations is None
+             else calc_account_supporting_opex(value, activations, months, start),
+             ('supporting_OPEX', 'active_accounts_number', 'new_accounts_per_year', *HORIZON, 'activations')),
+    ]
+    for fte in params.ftes:
+        nodes += _fte_nodes(fte.role, fte.shortname)
+    for component, column in enumerate(PAYROLL_COLUMNS):
+        nodes.append(Node(column, _payroll_total(component), (*HORIZON, 'payroll'),
+                          tuple(f'{fte.role}.{column}' for fte in params.ftes)))
+    nodes += [
+        Node('expenses', _sum, HORIZON, tuple(EXPENSE_COLUMNS)),
+        Node('profit', lambda revenue, expenses: revenue - expenses, deps=('revenue', 'expenses')),
+        Node('rolling_profit', lambda profit: np.cumsum(profit, axis=-1), deps=('profit',)),
+    ]
+    return nodes
+
+
+def _changed(old, new) -> bool:
+    if isinstance(old, np.ndarray) or isinstance(new, np.ndarray):
+        return old is None or new is None or not np.array_equal(old, new)
+    return old != new
+
+
+class ModelGraph:
+    """Incremental model: only nodes whose inputs or upstream nodes changed are recomputed on update"""
+
+    def __init__(self):
+        self.inputs = {}
+        self.values = {}
+        self.structure = {}
+        self.recomputed = []
+
+    def update(self, params: ModelParams, packs: np.ndarray = None, payroll: np.ndarray = None,
+               activations: np.ndarray = None) -> ModelResult:
+        # packs, payroll and activations, if given, replace the ramp-up of calc_packs, the FTE cards and the
+        # cohort OPEX timing as in engine.compute
+        inputs = {**flat_inputs(params), 'packs': packs, 'payroll': payroll, 'activations': activations}
+        changed = {name for name in inputs.keys() | self.inputs.keys()
+                   if name not in inputs or name not in self.inputs or _changed(self.inputs[name], inputs[name])}
+        nodes = build_nodes(params)
+
+        recomputed = []
+        for node in nodes:
+            structure = (node.inputs, node.deps)
+            if (node.name not in self.values or self.structure.get(node.name) != structure
+                    or changed.intersection(node.inputs) or set(recomputed).intersection(node.deps)):
+                self.values[node.name] = node.func(*(inputs[i] for i in node.inputs),
+                                                   *(self.values[d] for d in node.deps))
+                recomputed.append(node.name)
+
+        self.values = {node.name: self.values[node.name] for node in nodes}
+        self.structure = {node.name: (node.inputs, node.deps) for node in nodes}
+        self.inputs = inputs
+        self.recomputed = recomputed
+        return make_result({field: self.values[column] for column, field in COLUMN_FIELDS.items()})
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = 'pending', 'running', 'done', 'failed', 'cancelled'
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """Background computation with chunked progress and cooperative cancellation"""
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.status = PENDING
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created = time.monotonic()
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in (PENDING, RUNNING)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report(self, done: int, total: int):
+        """Progress callback of the job function, raises JobCancelled once cancel() was called"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = min(done / total, 1.0) if total else 1.0
+
+
+class JobRunner:
+    """Bounded thread pool shared between sessions, identical jobs are deduplicated by key.
+
+    NumPy releases the GIL in the vectorized chunks, so model batches run in parallel with the
+    script threads. The last `keep` finished jobs stay available to later reruns."""
+
+    def __init__(self, max_workers: int = 2, keep: int = 64):
+        self.keep = keep
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dsx-job')
+
+    def submit(self, key: Hashable, func: Callable, *args, **kwargs) -> Job:
+        """Job of key, started as func(*args, progress=job.report, **kwargs) unless an identical job is
+        running or finished; failed and cancelled jobs are started again"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status not in (FAILED, CANCELLED):
+                self._jobs.move_to_end(key)
+                return job
+            job = Job(key)
+            self._jobs[key] = job
+            self._evict()
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, key: Hashable) -> Job:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def _evict(self):
+        finished = [key for key, job in self._jobs.items() if not job.active]
+        for key in finished[:max(len(finished) - self.keep, 0)]:
+            del self._jobs[key]
+
+    @staticmethod
+    def _run(job: Job, func: Callable, args: tuple, kwargs: dict):
+        if job._cancel.is_set():
+            job.status = CANCELLED
+            return
+        job.status = RUNNING
+        try:
+            job.result = func(*args, progress=job.report, **kwargs)
+            job.progress = 1.0
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+        finally:
+            job.finished = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in (PENDING, RUNNING, DONE, FAILED, CANCELLED)}
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+from engine import FTE_INPUTS, MONTHS, PAYROLL_FIELDS, START, ModelParams, calendar, tax_condition, tax_percent
+from tables import read_table
+
+# environment variable with the path of the CSV/Parquet staff roster
+ROSTER_PATH_ENV = 'DSX_ROSTER_PATH'
+
+# roster column -> value used when the column is missing or empty
+ROSTER_DEFAULTS = {
+    'headcount': 1,
+    'compensation': 0,
+    'bonus_quarter': 0,
+    'bonus_year': 0,
+    'raise_pct': 0,
+}
+
+
+def month_index(dates, start: str = START) -> np.ndarray:
+    """Months from start of each date, NaN for missing dates"""
+    dates = pd.to_datetime(pd.Series(dates), errors='coerce')
+    origin = np.datetime64(start, 'M').astype(np.int64)
+    index = (dates.dt.year - 1970) * 12 + dates.dt.month - 1 - origin
+    return index.to_numpy(dtype=float, na_value=np.nan)
+
+
+def roster_from_ftes(ftes: tuple, medreps_number: float = 1) -> pd.DataFrame:
+    """One roster position per FTE card, medical representatives with medreps_number headcount"""
+    return pd.DataFrame({
+        'role': [fte.role for fte in ftes],
+        'headcount': [medreps_number if fte.shortname == 'mr' else 1 for fte in ftes],
+        'salary': [fte.salary for fte in ftes],
+        'compensation': [fte.compensation for fte in ftes],
+        'bonus_quarter': [fte.bonus_quarter for fte in ftes],
+        'bonus_year': [fte.bonus_year for fte in ftes],
+        'tax': [fte.tax for fte in ftes],
+    }, columns=['role', 'headcount', 'salary', 'compensation', 'bonus_quarter', 'bonus_year', 'tax'])
+
+
+def load_roster(source, name: str = None) -> pd.DataFrame:
+    """Roster from a CSV/Parquet path or file object with one position per row and at least 'role' and 'salary'.
+
+    Optional columns: headcount, compensation, bonus_quarter, bonus_year (percent), tax_type (a tax_condition
+    name) or tax (percent), hire_date, exit_date and raise_pct (annual raise every January)."""
+    name = str(source) if name is None else name
+    roster = read_table(source, name)
+    missing = {'role', 'salary'} - set(roster.columns)
+    if missing:
+        raise ValueError(f'Roster {name} has no {sorted(missing)} columns')
+    return roster
+
+
+def _column(roster: pd.DataFrame, name: str) -> np.ndarray:
+    default = ROSTER_DEFAULTS.get(name, 0)
+    if name not in roster:
+        return np.full(len(roster), float(default))
+    return roster[name].to_numpy(dtype=float, na_value=default)
+
+
+def _tax(roster: pd.DataFrame) -> np.ndarray:
+    if 'tax' in roster:
+        return _column(roster, 'tax')
+    if 'tax_type' in roster:
+        return tax_percent(roster['tax_type'].fillna(list(tax_condition)[0]))
+    return np.full(len(roster), float(tax_condition[list(tax_condition)[0]]))
+
+
+def payroll_matrix(roster: pd.DataFrame, months: int = MONTHS, start: str = START) -> np.ndarray:
+    """(positions, months, component) payroll of a roster, components in the order of PAYROLL_FIELDS.
+
+    A position is paid from its hire month until the month before exit, bonuses are paid at calendar
+    quarter and year ends on the salary of that month."""
+    month_of_year, year = calendar(start, months)
+    month = np.arange(months)
+    hire = np.nan_to_num(month_index(roster['hire_date'], start), nan=0) if 'hire_date' in roster \
+        else np.zeros(len(roster))
+    leave = np.nan_to_num(month_index(roster['exit_date'], start), nan=months) if 'exit_date' in roster \
+        else np.full(len(roster), months)
+
+    gross = _column(roster, 'headcount') / (1 - _tax(roster) / 100)
+    paid = ((month >= hire[:, None]) & (month < leave[:, None])) * gross[:, None]
+    salary = _column(roster, 'salary')[:, None] * (1 + _column(roster, 'raise_pct')[:, None] / 100) ** year
+
+    matrix = np.empty((len(roster), months, len(PAYROLL_FIELDS)))
+    matrix[..., 0] = salary * paid
+    matrix[..., 1] = _column(roster, 'compensation')[:, None] * paid
+    matrix[..., 2] = salary * 3 * _column(roster, 'bonus_quarter')[:, None] / 100 * paid * (month_of_year % 3 == 0)
+    matrix[..., 3] = salary * 12 * _column(roster, 'bonus_year')[:, None] / 100 * paid * (month_of_year == 12)
+    return matrix
+
+
+def group_totals(matrix: np.ndarray, groups) -> tuple:
+    """Group labels and (groups, months, component) sums of a payroll matrix, in order of first appearance"""
+    codes, labels = pd.factorize(pd.Series(groups), use_na_sentinel=False)
+    order = np.argsort(codes, kind='stable')
+    if not len(order):
+        return labels.to_numpy(), np.zeros((0, *matrix.shape[1:]))
+    bounds = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    return labels.to_numpy(), np.add.reduceat(matrix[order], bounds, axis=0)
+
+
+def roster_payroll(roster: pd.DataFrame, months: int = MONTHS, start: str = START) -> np.ndarray:
+    """(component, months) payroll totals of a roster, the payroll override of engine.compute"""
+    return payroll_matrix(roster, months, start).sum(axis=0).T
+
+
+def roster_fixed_inputs(params: ModelParams) -> list:
+    """Dashboard inputs without effect on the P&L while a roster payroll replaces the FTE cards"""
+    return ['medreps_number', *(f'{fte.shortname}_{suffix}' for fte in params.ftes for suffix in FTE_INPUTS)]
+
+
+def role_summary(roster: pd.DataFrame, months: int = MONTHS, start: str = START) -> pd.DataFrame:
+    """Headcount and payroll of every role over the horizon, rubles"""
+    roles, totals = group_totals(payroll_matrix(roster, months, start), roster['role'])
+    _, headcount = group_totals(_column(roster, 'headcount')[:, None, None], roster['role'])
+    df = pd.DataFrame(totals.sum(axis=1), index=pd.Index(roles, name='role'), columns=list(PAYROLL_FIELDS))
+    df.insert(0, 'headcount', headcount[:, 0, 0])
+    df['total'] = df[list(PAYROLL_FIELDS)].sum(axis=1)
+    return df
@@ -0,0 +1,192 @@
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+from cache import canonical_hash
+from engine import (PAYROLL_FIELDS, ModelParams, ModelResult, calc_account_initial_event,
+                    calc_account_supporting_opex, calc_cogs, calc_initial_event, calc_packs, calc_payroll,
+                    calc_revenue, calc_support_fee, calc_supporting_opex, input_value, make_result, transform_array,
+                    with_inputs)
+from tables import read_table
+from volume import weeks_per_month
+
+# environment variable with the path of the CSV/Parquet SKU list
+PORTFOLIO_PATH_ENV = 'DSX_PORTFOLIO_PATH'
+
+# widget-named inputs a SKU row may override, the rest come from the dashboard
+SKU_INPUTS = ['pack_price_pharmacy', 'pack_price_owner', 'pack_price_manufacturer', 'pack_price_pharmacy_change',
+              'active_accounts_number', 'patients_per_one_account_per_week', 'pack_growth', 'agency_fee',
+              'new_accounts_per_year']
+DIRECT_FIELDS = ['packs', 'revenue', 'cogs', 'support_fee']
+# shared cost group -> ModelResult fields allocated across SKUs by one driver
+SHARED_COSTS = {
+    'payroll': list(PAYROLL_FIELDS),
+    'opex': ['initial_event', 'supporting_opex'],
+}
+ALLOCATION_DRIVERS = ['revenue', 'gross_margin', 'packs', 'equal', 'weight']
+
+
+@dataclass(frozen=True)
+class PortfolioResult:
+    skus: np.ndarray
+    by_sku: ModelResult
+    total: ModelResult
+
+
+def load_portfolio(source, name: str = None) -> pd.DataFrame:
+    """SKU list from a CSV/Parquet path or file object, one SKU per row with a 'sku' column and SKU_INPUTS
+    columns overriding the dashboard values; an optional 'weight' column is the 'weight' allocation driver"""
+    name = str(source) if name is None else name
+    skus = read_table(source, name)
+    if 'sku' not in skus:
+        raise ValueError(f"SKU list {name} has no 'sku' column")
+    if skus['sku'].duplicated().any():
+        raise ValueError(f"SKU list {name} has duplicated SKUs")
+    return skus
+
+
+def sku_inputs(skus: pd.DataFrame, params: ModelParams) -> dict:
+    """SKU input columns, blank cells take the dashboard value of params"""
+    return {name: skus[name].to_numpy(dtype=float, na_value=input_value(params, name))
+            for name in SKU_INPUTS if name in skus}
+
+
+def direct_items(params: ModelParams) -> dict:
+    """Packs, revenue, COGS and support fee of (N,) SKU inputs, each (N, months)"""
+    months, start = params.horizon_months, params.start
+    packs = calc_packs(params.active_accounts_number, params.patients_per_one_account_per_week,
+                       params.pack_growth, months, params.new_accounts_per_year, start,
+                       weeks_per_month(start, months, params.volume_calendar, params.seasonality))
+    items = dict(
+        packs=packs,
+        revenue=calc_revenue(packs, params.pack_price_owner, params.pack_price_pharmacy_change),
+        cogs=calc_cogs(packs, params.pack_price_manufacturer),
+        support_fee=calc_support_fee(packs, params.pack_price_pharmacy, params.pack_price_pharmacy_change,
+                                     params.agency_fee),
+    )
+    shape = np.broadcast_shapes(*(values.shape for values in items.values()))
+    return {name: np.broadcast_to(values, shape) for name, values in items.items()}
+
+
+def shared_costs(params: ModelParams, payroll: np.ndarray = None, activations: np.ndarray = None) -> dict:
+    """Field force payroll and account OPEX of the whole portfolio, each (months,).
+
+    payroll and activations replace the FTE cards and the yearly cohorts as in engine.compute"""
+    months, start = params.horizon_months, params.start
+    if activations is None:
+        opex = dict(
+            initial_event=calc_initial_event(params.initial_event, params.active_accounts_number, months,
+                                             params.new_accounts_per_year, start),
+            supporting_opex=calc_supporting_opex(params.supporting_OPEX, params.active_accounts_number, months,
+                                                 params.new_accounts_per_year, start),
+        )
+    else:
+        opex = dict(
+            initial_event=calc_account_initial_event(params.initial_event, activations),
+            supporting_opex=calc_account_supporting_opex(params.supporting_OPEX, activations, months, start),
+        )
+    return dict(
+        **(calc_payroll(params.ftes, params.medreps_number, months, start) if payroll is None
+           else dict(zip(PAYROLL_FIELDS, payroll))),
+        **opex,
+    )
+
+
+def allocation_shares(direct: dict, driver: str, weights: np.ndarray = None) -> np.ndarray:
+    """(SKU, months) shares of a shared cost, equal shares in months where the driver sums to zero"""
+    packs = direct['packs']
+    if driver == 'revenue':
+        values = direct['revenue']
+    elif driver == 'gross_margin':
+        values = np.maximum(direct['revenue'] - direct['cogs'] - direct['support_fee'], 0)
+    elif driver == 'packs':
+        values = packs
+    elif driver == 'equal':
+        values = np.ones_like(packs)
+    elif driver == 'weight':
+        if weights is None:
+            raise ValueError("SKU list has no 'weight' column")
+        values = np.broadcast_to(np.asarray(weights, dtype=float)[:, None], packs.shape)
+    else:
+        raise ValueError(f'Unknown allocation driver: {driver}')
+    total = values.sum(axis=0)
+    return np.where(total > 0, values / np.where(total > 0, total, 1), 1 / max(len(packs), 1))
+
+
+def allocate(skus: np.ndarray, direct: dict, shared: dict, drivers: dict, weights: np.ndarray = None) \
+        -> PortfolioResult:
+    items = dict(direct)
+    for group, fields in SHARED_COSTS.items():
+        shares = allocation_shares(direct, drivers.get(group, 'revenue'), weights)
+        items.update({field: shares * shared[field] for field in fields})
+    by_sku = make_result(items)
+    total = make_result({name: values.sum(axis=0) for name, values in items.items()})
+    return PortfolioResult(skus=skus, by_sku=by_sku, total=total)
+
+
+class PortfolioModel:
+    """Portfolio P&L where a rerun recomputes the direct line items only of SKUs whose rows changed"""
+
+    def __init__(self):
+        self.context = None
+        self.skus = np.empty(0, dtype=object)
+        self.row_hashes = np.empty(0, dtype=np.uint64)
+        self.direct = {}
+        self.recomputed = []
+
+    def update(self, skus: pd.DataFrame, params: ModelParams, payroll: np.ndarray = None,
+               drivers: dict = None, activations: np.ndarray = None) -> PortfolioResult:
+        columns = [name for name in SKU_INPUTS if name in skus]
+        # SKU rows inherit the dashboard inputs, any change of those or of the horizon recomputes all SKUs
+        context = canonical_hash([replace(params, ftes=()), columns])
+        ids = skus['sku'].to_numpy()
+        hashes = pd.util.hash_pandas_object(skus[columns], index=False).to_numpy() if columns \
+            else np.zeros(len(ids), dtype=np.uint64)
+
+        stale = np.ones(len(ids), dtype=bool)
+        reused = np.full(len(ids), -1)
+        if context == self.context and len(self.skus):
+            position = pd.Index(self.skus).get_indexer(ids)
+            found = position >= 0
+            same = np.zeros(len(ids), dtype=bool)
+            same[found] = self.row_hashes[position[found]] == hashes[found]
+            stale = ~same
+            reused[same] = position[same]
+
+        shape = (len(ids), params.horizon_months)
+        direct = {name: np.empty(shape) for name in DIRECT_FIELDS}
+        if (~stale).any():
+            for name in DIRECT_FIELDS:
+                direct[name][~stale] = self.direct[name][reused[~stale]]
+        if stale.any():
+            part = {name: values[stale] for name, values in sku_inputs(skus, params).items()}
+            computed = direct_items(with_inputs(replace(params, ftes=()), part))
+            for name in DIRECT_FIELDS:
+                direct[name][stale] = computed[name]
+
+        self.context, self.skus, self.row_hashes, self.direct = context, ids, hashes, direct
+        self.recomputed = ids[stale].tolist()
+        weights = skus['weight'].to_numpy(dtype=float, na_value=0) if 'weight' in skus else None
+        return allocate(ids, direct, shared_costs(params, payroll, activations), drivers or {}, weights)
+
+
+def sku_result(portfolio: PortfolioResult, sku) -> ModelResult:
+    """Monthly P&L of one SKU with its share of the shared costs"""
+    row = int(np.flatnonzero(portfolio.skus == sku)[0])
+    return ModelResult(**{name: getattr(portfolio.by_sku, name)[row]
+                          for name in ModelResult.__dataclass_fields__})
+
+
+def sku_summary(portfolio: PortfolioResult) -> pd.DataFrame:
+    """P&L of every SKU over the horizon in thousands of rubles, expenses with negative sign"""
+    by_sku = portfolio.by_sku
+    return pd.DataFrame({
+        'packs': transform_array(by_sku.packs.sum(axis=1), reverse_sign=False, kilo_view=False),
+        'revenue': transform_array(by_sku.revenue.sum(axis=1), reverse_sign=False),
+        'COGS': transform_array(by_sku.cogs.sum(axis=1)),
+        'support_fee': transform_array(by_sku.support_fee.sum(axis=1)),
+        'payroll': transform_array(sum(getattr(by_sku, i) for i in SHARED_COSTS['payroll']).sum(axis=1)),
+        'opex': transform_array(sum(getattr(by_sku, i) for i in SHARED_COSTS['opex']).sum(axis=1)),
+        'profit': transform_array(by_sku.profit.sum(axis=1), reverse_sign=False),
+    }, index=pd.Index(portfolio.skus, name='sku'))
@@ -0,0 +1,52 @@
+import json
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+SAMPLES_PER_STAGE = 200
+
+
+class StageProfiler:
+    """Wall-clock timings of named stages of a script run, last SAMPLES_PER_STAGE runs per stage.
+
+    lap(name) closes the stage that ends at the call. When disabled it costs one attribute check."""
+
+    def __init__(self, maxlen: int = SAMPLES_PER_STAGE):
+        self.enabled = False
+        self.maxlen = maxlen
+        self.samples = {}
+        self._run = {}
+        self._started = None
+        self._last = None
+
+    def start_run(self, enabled: bool = True):
+        self.enabled = enabled
+        self._run = {}
+        self._started = self._last = time.perf_counter_ns() if enabled else None
+
+    def lap(self, name: str):
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        self._run[name] = self._run.get(name, 0) + now - self._last
+        self._last = now
+
+    def end_run(self):
+        if not self.enabled:
+            return
+        self._run['total'] = time.perf_counter_ns() - self._started
+        for name, elapsed_ns in self._run.items():
+            self.samples.setdefault(name, deque(maxlen=self.maxlen)).append(elapsed_ns / 1e6)
+        self._run = {}
+
+    def summary(self) -> pd.DataFrame:
+        """Runs, last, p50 and p95 milliseconds of every stage in order of first appearance"""
+        rows = [(name, len(values), values[-1], *np.percentile(np.asarray(values), [50, 95]))
+                for name, values in self.samples.items()]
+        return pd.DataFrame(rows, columns=['stage', 'runs', 'last_ms', 'p50_ms', 'p95_ms']).set_index('stage')
+
+    def to_json(self) -> str:
+        return json.dumps({'samples_ms': {name: list(values) for name, values in self.samples.items()},
+                           'summary': self.summary().reset_index().to_dict(orient='records')}, indent=2)
@@ -0,0 +1,141 @@
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from engine import ModelResult, batch_frame
+
+# environment variable with the path of the SQLite scenario store
+STORE_PATH_ENV = 'DSX_STORE_PATH'
+STORE_PATH = 'scenarios.sqlite'
+
+RESULT_FIELDS = list(ModelResult.__dataclass_fields__)
+FIELD_INDEX = {name: i for i, name in enumerate(RESULT_FIELDS)}
+EXPENSE_INDEX = [FIELD_INDEX[i] for i in RESULT_FIELDS if i not in ('packs', 'revenue')]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    tag TEXT,
+    created REAL NOT NULL,
+    start TEXT NOT NULL,
+    months INTEGER NOT NULL,
+    fields TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    results BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scenarios_tag ON scenarios (tag, name);
+CREATE INDEX IF NOT EXISTS scenarios_created ON scenarios (created);
+"""
+
+
+def pack_result(result: ModelResult) -> bytes:
+    """(fields, months) float64 array of a single-scenario result as little-endian bytes"""
+    return np.stack([np.asarray(getattr(result, field), dtype='<f8') for field in RESULT_FIELDS]).tobytes()
+
+
+def unpack_results(blobs: list, months: list, fields: int = len(RESULT_FIELDS)) -> np.ndarray:
+    """(scenarios, fields, months) array of packed results, shorter horizons padded with NaN"""
+    if len(set(months)) == 1:
+        return np.frombuffer(b''.join(blobs), dtype='<f8').reshape(len(blobs), fields, months[0])
+    stacked = np.full((len(blobs), fields, max(months, default=0)), np.nan)
+    for i, (blob, length) in enumerate(zip(blobs, months)):
+        stacked[i, :, :length] = np.frombuffer(blob, dtype='<f8').reshape(fields, length)
+    return stacked
+
+
+class ScenarioStore:
+    """Named scenarios with their inputs and monthly results in a local SQLite file, safe to share between
+    sessions"""
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def save(self, name: str, inputs: dict, result: ModelResult, start: str, tag: str = None) -> int:
+        """Store a scenario, an existing scenario of the same name is replaced"""
+        months = int(np.shape(result.packs)[-1])
+        row = (name, tag or None, time.time(), start, months, json.dumps(RESULT_FIELDS),
+               json.dumps(inputs, ensure_ascii=False, default=str), pack_result(result))
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                'INSERT INTO scenarios (name, tag, created, start, months, fields, inputs, results) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET tag = excluded.tag, created = excluded.created, '
+                'start = excluded.start, months = excluded.months, fields = excluded.fields, '
+                'inputs = excluded.inputs, results = excluded.results', row)
+            return cursor.lastrowid
+
+    def catalog(self, tag: str = None) -> pd.DataFrame:
+        """Scenarios without their results, newest first"""
+        query = 'SELECT id, name, tag, created, start, months FROM scenarios'
+        params = ()
+        if tag:
+            query += ' WHERE tag = ?'
+            params = (tag,)
+        with self._lock:
+            df = pd.read_sql_query(query + ' ORDER BY created DESC', self._connection, params=params)
+        df['created'] = pd.to_datetime(df['created'], unit='s').dt.floor('s')
+        return df
+
+    def tags(self) -> list:
+        with self._lock:
+            rows = self._connection.execute('SELECT DISTINCT tag FROM scenarios WHERE tag IS NOT NULL ORDER BY tag')
+            return [tag for tag, in rows]
+
+    def load(self, names: list) -> tuple:
+        """Inputs and the (scenarios, fields, months) stacked results of names, in the order of names.
+
+        Scenarios saved with other result fields than RESULT_FIELDS cannot be unpacked and raise ValueError."""
+        placeholders = ', '.join('?' * len(names))
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT name, start, months, fields, inputs, results FROM scenarios WHERE name IN ({placeholders})',
+                list(names)).fetchall()
+        outdated = [row[0] for row in rows if json.loads(row[3]) != RESULT_FIELDS]
+        if outdated:
+            raise ValueError(f'Scenarios {outdated} were saved by another model version and cannot be loaded')
+        rows = sorted(rows, key=lambda row: list(names).index(row[0]))
+        inputs = {name: {'start': start, **json.loads(values)} for name, start, _, _, values, _ in rows}
+        return inputs, unpack_results([row[5] for row in rows], [row[2] for row in rows])
+
+    def delete(self, names: list):
+        with self._lock, self._connection:
+            self._connection.executemany('DELETE FROM scenarios WHERE name = ?', [(name,) for name in names])
+
+
+def comparison_frame(names: list, stacked: np.ndarray, baseline: int = 0) -> pd.DataFrame:
+    """Totals of every scenario in thousands of rubles and their deltas to the baseline scenario"""
+    totals = np.nansum(stacked, axis=-1)
+    revenue = totals[:, FIELD_INDEX['revenue']]
+    expenses = totals[:, EXPENSE_INDEX].sum(axis=1)
+    summary = np.stack([totals[:, FIELD_INDEX['packs']], revenue / 1000, -expenses / 1000,
+                        (revenue - expenses) / 1000], axis=1)
+    deltas = summary - summary[baseline]
+    columns = ['packs', 'revenue', 'expenses', 'profit']
+    return pd.DataFrame(np.trunc(np.hstack([summary, deltas])).astype(np.int64),
+                        columns=[*columns, *(f'Δ {i}' for i in columns)],
+                        index=pd.Index(names, name='scenario'))
+
+
+def rolling_profit(stacked: np.ndarray) -> np.ndarray:
+    """(scenarios, months) cumulative profit of stacked results, NaN beyond a scenario's horizon"""
+    profit = stacked[:, FIELD_INDEX['revenue']] - stacked[:, EXPENSE_INDEX].sum(axis=1)
+    return np.cumsum(profit, axis=-1)
+
+
+def scenario_batch_frame(inputs: dict, stacked: np.ndarray) -> pd.DataFrame:
+    """Monthly P&L of loaded scenarios in the long form of engine.batch_frame, each over its own horizon"""
+    frames = []
+    for (name, values), results in zip(inputs.items(), stacked):
+        months = int(np.count_nonzero(~np.isnan(results[FIELD_INDEX['packs']])))
+        result = ModelResult(**{field: results[i, None, :months] for i, field in enumerate(RESULT_FIELDS)})
+        frames.append(batch_frame(result, values['start'], [name]))
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from engine import FTE_INPUTS, ModelParams, compute_batch, input_value
+from solver import total_profit
+
+SENSITIVITY_INPUTS = ['pack_price_pharmacy', 'pack_price_owner', 'pack_price_manufacturer', 'initial_event',
+                      'supporting_OPEX', 'agency_fee', 'pack_growth', 'patients_per_one_account_per_week']
+
+
+def sensitivity_inputs(params: ModelParams, exclude=()) -> list:
+    """Inputs of the tornado without those in exclude, e.g. inputs fixed by a model override"""
+    names = SENSITIVITY_INPUTS + [f'{fte.shortname}_{suffix}' for fte in params.ftes for suffix in FTE_INPUTS]
+    return [name for name in names if name not in exclude]
+
+
+def tornado(base: ModelParams, pct: float = 10, names: list = None, metric=total_profit,
+            **overrides) -> pd.DataFrame:
+    """Metric change when each input moves by -pct% and +pct%, sorted by the size of the effect.
+
+    The base case and all 2*K perturbations are stacked into one (2*K + 1,) scenario batch,
+    overrides are passed to compute_batch."""
+    names = sensitivity_inputs(base) if names is None else names
+    values = np.array([input_value(base, name) for name in names], dtype=float)
+
+    # row 0 is the base case, rows 2*i + 1 and 2*i + 2 move input i down and up
+    scenarios = np.tile(values, (2 * len(names) + 1, 1))
+    rows = np.arange(len(names))
+    scenarios[2 * rows + 1, rows] *= 1 - pct / 100
+    scenarios[2 * rows + 2, rows] *= 1 + pct / 100
+
+    outcome = metric(compute_batch(base, {name: scenarios[:, i] for i, name in enumerate(names)}, **overrides))
+    base_outcome = outcome[0]
+    df = pd.DataFrame({'input': names,
+                       'value': values,
+                       'low': outcome[1::2] - base_outcome,
+                       'high': outcome[2::2] - base_outcome})
+    df['range'] = (df['high'] - df['low']).abs()
+    return df.sort_values('range', ascending=False, ignore_index=True)
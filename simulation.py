@@ -0,0 +1,118 @@
+from dataclasses import dataclass, field
+from typing import Callable, Mapping
+
+import numpy as np
+
+from engine import ModelParams, compute_batch
+
+# model inputs that can be drawn from a distribution
+RANDOM_INPUTS = ['pack_growth', 'patients_per_one_account_per_week', 'pack_price_pharmacy_change',
+                 'active_accounts_number']
+
+QUANTILES = (5, 50, 95)
+
+# scenario x month cells per batch, 50,000 scenarios of a 12-month horizon; bounds the memory of a batch
+# whatever the horizon
+CHUNK_CELLS = 600_000
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """Distribution of one input set by its range: uniform, triangular with the mode inside, or normal with
+    [low, high] as the 90% interval"""
+    kind: str
+    low: float
+    high: float
+    mode: float = None
+    clip_low: float = None
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        if self.kind == 'uniform':
+            values = rng.uniform(self.low, self.high, size)
+        elif self.kind == 'triangular':
+            mode = (self.low + self.high) / 2 if self.mode is None else min(max(self.mode, self.low), self.high)
+            values = rng.triangular(self.low, mode, self.high, size)
+        elif self.kind == 'normal':
+            values = rng.normal((self.low + self.high) / 2, (self.high - self.low) / 3.29, size)
+        elif self.kind == 'fixed':
+            values = np.full(size, float(self.low))
+        else:
+            raise ValueError(f'Unknown distribution: {self.kind}')
+        return values if self.clip_low is None else np.maximum(values, self.clip_low)
+
+
+class StreamingHistogram:
+    """Per-month histograms with fixed edges set by the first chunk, memory does not grow with the draw count"""
+
+    def __init__(self, bins: int = 2048, margin: float = 0.5):
+        self.bins = bins
+        self.margin = margin
+        self.counts = None
+        self.low = None
+        self.width = None
+        self.min = None
+        self.max = None
+        self.total = 0
+
+    def update(self, values: np.ndarray):
+        # values: (draws, months)
+        if self.counts is None:
+            low, high = values.min(axis=0), values.max(axis=0)
+            span = np.maximum(high - low, np.maximum(np.abs(high), 1.0) * 1e-6)
+            self.low = low - span * self.margin
+            self.width = span * (1 + 2 * self.margin) / self.bins
+            self.counts = np.zeros((values.shape[1], self.bins), dtype=np.int64)
+            self.min, self.max = low, high
+        else:
+            self.min = np.minimum(self.min, values.min(axis=0))
+            self.max = np.maximum(self.max, values.max(axis=0))
+        # values outside of the edges fall into the end bins, exact extremes are kept in min/max
+        idx = np.clip(((values - self.low) / self.width).astype(np.int64), 0, self.bins - 1)
+        flat = idx + np.arange(values.shape[1]) * self.bins
+        self.counts += np.bincount(flat.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+        self.total += values.shape[0]
+
+    def quantile(self, q: float) -> np.ndarray:
+        cum = np.cumsum(self.counts, axis=1)
+        target = q * self.total
+        pos = np.minimum((cum < target).sum(axis=1), self.bins - 1)
+        months = np.arange(self.counts.shape[0])
+        before = np.where(pos > 0, cum[months, np.maximum(pos - 1, 0)], 0)
+        inside = self.counts[months, pos]
+        frac = np.where(inside > 0, (target - before) / np.maximum(inside, 1), 0.0)
+        values = self.low + (pos + frac) * self.width
+        return np.clip(values, self.min, self.max)
+
+
+@dataclass
+class SimulationResult:
+    draws: int
+    seed: int
+    quantiles: dict = field(default_factory=dict)
+    loss_probability: float = 0.0
+
+
+def run_monte_carlo(base: ModelParams, distributions: Mapping, draws: int = 100_000, seed: int = 0,
+                    chunk_size: int = None, progress: Callable = None, **overrides) -> SimulationResult:
+    """Monte Carlo over rolling_profit, evaluated in batches of compute_batch, by default of CHUNK_CELLS cells.
+
+    progress(done, draws) is called after every batch, overrides are passed to compute_batch."""
+    chunk_size = max(1, CHUNK_CELLS // base.horizon_months) if chunk_size is None else chunk_size
+    rng = np.random.default_rng(seed)
+    histogram = StreamingHistogram()
+    losses = 0
+    done = 0
+    while done < draws:
+        size = min(chunk_size, draws - done)
+        scenarios = {name: dist.sample(rng, size) for name, dist in distributions.items()}
+        rolling_profit = compute_batch(base, scenarios, **overrides).rolling_profit
+        histogram.update(rolling_profit)
+        losses += int((rolling_profit[:, -1] < 0).sum())
+        done += size
+        if progress is not None:
+            progress(done, draws)
+
+    return SimulationResult(draws=draws,
+                            seed=seed,
+                            quantiles={q: histogram.quantile(q / 100) for q in QUANTILES},
+                            loss_probability=losses / draws)
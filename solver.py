@@ -0,0 +1,85 @@
+from typing import Callable
+
+import numpy as np
+
+from engine import FTE_INPUTS, ModelParams, ModelResult, compute_batch
+
+# search range of every numeric input that can be solved for
+SEARCH_RANGES = {
+    'pack_price_pharmacy': (1, 100_000),
+    'pack_price_owner': (1, 100_000),
+    'pack_price_manufacturer': (0, 100_000),
+    'pack_price_pharmacy_change': (-100, 500),
+    'active_accounts_number': (1, 10_000),
+    'patients_per_one_account_per_week': (0, 1_000),
+    'pack_growth': (-50, 200),
+    'agency_fee': (0, 100),
+    'initial_event': (0, 10_000_000),
+    'supporting_OPEX': (0, 10_000_000),
+    'medreps_number': (0, 1_000),
+    'new_accounts_per_year': (0, 10_000),
+}
+FTE_SEARCH_RANGES = {
+    'salary_gross': (0, 10_000_000),
+    'compensation': (0, 10_000_000),
+    'quarter_bonus': (0, 1_000),
+    'year_bonus': (0, 1_000),
+}
+
+
+def total_profit(result: ModelResult) -> np.ndarray:
+    return result.profit.sum(axis=-1)
+
+
+def solvable_inputs(params: ModelParams, exclude=()) -> dict:
+    """Input name -> search range, including the inputs of chosen FTE cards, without those in exclude"""
+    ranges = dict(SEARCH_RANGES)
+    for fte in params.ftes:
+        ranges.update({f'{fte.shortname}_{suffix}': FTE_SEARCH_RANGES[suffix] for suffix in FTE_INPUTS})
+    return {name: values for name, values in ranges.items() if name not in exclude}
+
+
+def solve(base: ModelParams, name: str, targets=0.0, low: float = None, high: float = None,
+          metric: Callable = total_profit, grid: int = 64, tol: float = 1e-6, max_iter: int = 100,
+          **overrides) -> np.ndarray:
+    """Values of input `name` that bring metric to each of targets, NaN where no solution in [low, high].
+
+    All targets are bracketed on a common grid in one batch and then bisected together,
+    the first crossing inside the range is returned. overrides are passed to compute_batch."""
+    targets = np.atleast_1d(np.asarray(targets, dtype=float))
+    default_low, default_high = solvable_inputs(base)[name]
+    low = default_low if low is None else low
+    high = default_high if high is None else high
+
+    def residual(values: np.ndarray) -> np.ndarray:
+        # values: (targets, points) evaluated as one flat scenario batch
+        return metric(compute_batch(base, {name: values.ravel()}, **overrides)).reshape(values.shape) - targets[:, None]
+
+    # bracketing: first sign change of every target on a common grid
+    points = np.linspace(low, high, grid)
+    values = residual(np.broadcast_to(points, (targets.size, grid)))
+    crossing = np.signbit(values[:, :-1]) != np.signbit(values[:, 1:])
+    found = crossing.any(axis=1) | (values[:, 0] == 0)
+    first = np.argmax(crossing, axis=1)
+    lo, hi = points[first], points[first + 1]
+    f_lo = values[np.arange(targets.size), first]
+
+    # bisection of all brackets at once
+    for _ in range(max_iter):
+        if np.all(hi - lo <= tol * np.maximum(1, np.abs(lo))):
+            break
+        mid = (lo + hi) / 2
+        f_mid = residual(mid[:, None])[:, 0]
+        left = np.signbit(f_mid) != np.signbit(f_lo)
+        hi = np.where(left, mid, hi)
+        lo = np.where(left, lo, mid)
+        f_lo = np.where(left, f_lo, f_mid)
+
+    solution = np.where(values[:, 0] == 0, points[0], hi)
+    return np.where(found, solution, np.nan)
+
+
+def break_even_month(result: ModelResult) -> np.ndarray:
+    """Index of the first month with non-negative rolling profit, -1 if there is none"""
+    positive = result.rolling_profit >= 0
+    return np.where(positive.any(axis=-1), np.argmax(positive, axis=-1), -1)
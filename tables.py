@@ -0,0 +1,7 @@
+import pandas as pd
+
+
+def read_table(source, name: str = None) -> pd.DataFrame:
+    """Table from a CSV or Parquet path or file object, the format is taken from the extension of name or path"""
+    name = str(source) if name is None else name
+    return pd.read_parquet(source) if name.endswith('.parquet') else pd.read_csv(source)
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from account_model import activation_counts, registry_model
+from accounts import registry_from_district_counts
+from engine import calc_packs
+
+
+def test_cohorts_share_the_monthly_activation_capacity():
+    registry = registry_from_district_counts()
+    accounts = registry.select(registry.districts)
+    _, activations = registry_model(accounts, 100, 4, 10, 5, 36, 4, 10)
+    assert activations.max() <= 5
+    assert activations.sum() == 120
+    # the second cohort queues behind the first one, which takes 20 months to activate
+    assert np.array_equal(activations[:22], np.full(22, 5.0))
+
+
+def test_activation_counts():
+    assert activation_counts([0, 0, 2, 5], 4).tolist() == [2, 0, 1, 0]
+
+
+@pytest.mark.parametrize('months, new_accounts', [(12, 0), (36, 3)])
+def test_uniform_registry_reproduces_calc_packs(months, new_accounts):
+    # identical institutions activated as they arrive follow the aggregate ramp-up and growth curve
+    accounts = pd.DataFrame(index=range(20))
+    packs, _ = registry_model(accounts, 12, 4, 10, 1000, months, 4, new_accounts)
+    assert np.array_equal(packs, calc_packs(12, 4, 10, months, new_accounts))
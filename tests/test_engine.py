@@ -0,0 +1,65 @@
+"""The engine's monthly P&L pinned to the output of the original single-file dsxv2.py script."""
+import numpy as np
+import pytest
+
+from engine import EXPENSE_COLUMNS, PNL_COLUMNS, ModelParams, compute, pnl_frame
+
+# widget values of each case on top of the dashboard defaults, and the P&L the original script showed for them
+CASES = {
+    'defaults': ({'chosen_fte': ['MedRep']}, {
+        'packs': [48, 96, 144, 192, 281, 309, 340, 374, 411, 452, 497, 547],
+        'revenue': [168, 336, 504, 672, 983, 1081, 1190, 1309, 1438, 1582, 1739, 1914],
+        'COGS': [-72, -144, -216, -288, -421, -463, -510, -561, -616, -678, -745, -820],
+        'salary': [-117, -117, -117, -117, -117, -117, -117, -117, -117, -117, -117, -117],
+        'repr_exp': [-29, -29, -29, -29, -29, -29, -29, -29, -29, -29, -29, -29],
+        'bonus_Q': [0, 0, -70, 0, 0, -70, 0, 0, -70, 0, 0, -70],
+        'bonus_Y': [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, -423],
+        'support_fee': [-24, -48, -72, -96, -140, -154, -170, -187, -205, -226, -248, -273],
+        'initial_event': [-600, -600, -600, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        'supporting_opex': [0, 0, 0, -40, -40, -40, -40, -40, -40, -40, -40, -40],
+    }),
+    'all_roles': ({
+        'chosen_fte': ['MedRep', 'ProdMan', 'ComDir'], 'medreps_number': 3, 'pack_growth': 25,
+        'pack_price_pharmacy_change': -15, 'active_accounts_number': 40, 'patients_per_one_account_per_week': 7,
+        'agency_fee': 12, 'pm_salary_gross': 180000, 'pm_tax_type': 'ЮрЛицо', 'cd_salary_gross': 250000,
+        'cd_quarter_bonus': 15,
+    }, {
+        'packs': [280, 560, 840, 1120, 2734, 3417, 4272, 5340, 6675, 8344, 10430, 13038],
+        'revenue': [833, 1666, 2499, 3332, 8133, 10165, 12709, 15886, 19858, 24823, 31029, 38788],
+        'COGS': [-420, -840, -1260, -1680, -4101, -5125, -6408, -8010, -10012, -12516, -15645, -19557],
+        'salary': [-827, -827, -827, -827, -827, -827, -827, -827, -827, -827, -827, -827],
+        'repr_exp': [-88, -88, -88, -88, -88, -88, -88, -88, -88, -88, -88, -88],
+        'bonus_Q': [0, 0, -349, 0, 0, -349, 0, 0, -349, 0, 0, -349],
+        'bonus_Y': [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, -1327],
+        'support_fee': [-142, -285, -428, -571, -1394, -1742, -2178, -2723, -3404, -4255, -5319, -6649],
+        'initial_event': [-2000, -2000, -2000, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        'supporting_opex': [0, 0, 0, -133, -133, -133, -133, -133, -133, -133, -133, -133],
+    }),
+}
+
+
+@pytest.mark.parametrize('inputs, expected', CASES.values(), ids=list(CASES))
+def test_pnl_frame_matches_original_script(inputs, expected):
+    df = pnl_frame(compute(ModelParams.from_inputs(inputs)))
+    assert df['date'].dt.strftime('%Y-%m-%d').tolist() == [f'2024-{month:02d}-{day}' for month, day in zip(
+        range(1, 13), [31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])]
+    for column in PNL_COLUMNS:
+        assert df[column].tolist() == expected[column], column
+    assert df['expenses'].tolist() == df[EXPENSE_COLUMNS].sum(axis=1).tolist()
+    assert df['profit'].tolist() == (df['revenue'] + df['expenses']).tolist()
+    assert df['rolling_profit'].tolist() == np.cumsum(df['profit']).tolist()
+
+
+def test_batch_rows_match_single_runs():
+    inputs = [CASES['defaults'][0], {**CASES['defaults'][0], 'pack_growth': 25, 'agency_fee': 12}]
+    batch = compute(ModelParams.from_inputs({**inputs[0], 'pack_growth': np.array([10, 25]),
+                                             'agency_fee': np.array([10, 12])}))
+    for row, values in enumerate(inputs):
+        single = compute(ModelParams.from_inputs(values))
+        assert np.array_equal(batch.profit[row], single.profit)
+
+
+def test_pnl_values_beyond_int64_are_refused():
+    params = ModelParams(horizon_months=120, pack_growth=50)
+    with pytest.raises(ValueError):
+        pnl_frame(compute(params), params.start)
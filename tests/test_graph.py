@@ -0,0 +1,33 @@
+from dataclasses import fields
+
+import numpy as np
+
+from engine import ModelParams, ModelResult, compute
+from graph import ModelGraph
+
+INPUTS = {'chosen_fte': ['MedRep', 'ProdMan'], 'medreps_number': 2}
+
+
+def test_quarter_bonus_recomputes_only_its_downstream_nodes():
+    graph = ModelGraph()
+    graph.update(ModelParams.from_inputs(INPUTS))
+    graph.update(ModelParams.from_inputs({**INPUTS, 'mr_quarter_bonus': 50}))
+    assert graph.recomputed == ['MedRep.bonus_Q', 'bonus_Q', 'expenses', 'profit', 'rolling_profit']
+
+
+def test_update_matches_compute_across_changes():
+    steps = [
+        ({}, {}),
+        ({'pack_growth': 25}, {}),
+        ({'pack_growth': 25, 'horizon_months': 36, 'new_accounts_per_year': 2}, {}),
+        ({'horizon_months': 36, 'chosen_fte': ['MedRep']}, {}),
+        ({'horizon_months': 36}, {'packs': np.full(36, 100.0), 'activations': np.r_[5.0, np.zeros(35)]}),
+        ({'horizon_months': 36}, {'payroll': np.full((4, 36), 1000.0)}),
+        ({}, {}),
+    ]
+    graph = ModelGraph()
+    for inputs, overrides in steps:
+        params = ModelParams.from_inputs({**INPUTS, **inputs})
+        result, expected = graph.update(params, **overrides), compute(params, **overrides)
+        for field in fields(ModelResult):
+            np.testing.assert_allclose(getattr(result, field.name), getattr(expected, field.name))
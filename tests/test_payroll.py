@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+
+from engine import PAYROLL_FIELDS, ModelParams, calc_payroll
+from payroll import roster_from_ftes, roster_payroll
+
+
+@pytest.mark.parametrize('months, start', [(12, '2024-01'), (36, '2024-05')])
+def test_roster_of_the_fte_cards_matches_calc_payroll(months, start):
+    params = ModelParams.from_inputs({'chosen_fte': ['MedRep', 'ProdMan', 'ComDir'], 'medreps_number': 3,
+                                      'horizon_months': months, 'start': start})
+    expected = calc_payroll(params.ftes, params.medreps_number, months, start)
+    payroll = roster_payroll(roster_from_ftes(params.ftes, params.medreps_number), months, start)
+    np.testing.assert_allclose(payroll, np.array([expected[name] for name in PAYROLL_FIELDS]))
@@ -0,0 +1,28 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from engine import ModelParams, compute
+from scenario_store import ScenarioStore
+
+
+def test_saved_results_load_back(tmp_path):
+    store = ScenarioStore(str(tmp_path / 'scenarios.sqlite'))
+    params = ModelParams.from_inputs({'horizon_months': 24})
+    result = compute(params)
+    store.save('base', {'pack_growth': params.pack_growth}, result, params.start)
+    inputs, stacked = store.load(['base'])
+    assert inputs == {'base': {'start': params.start, 'pack_growth': params.pack_growth}}
+    np.testing.assert_array_equal(stacked[0, 0], result.packs)
+
+
+def test_results_of_other_fields_are_refused(tmp_path):
+    path = str(tmp_path / 'scenarios.sqlite')
+    store = ScenarioStore(path)
+    params = ModelParams()
+    store.save('old', {}, compute(params), params.start)
+    with sqlite3.connect(path) as connection:
+        connection.execute('''UPDATE scenarios SET fields = '["packs", "revenue"]' ''')
+    with pytest.raises(ValueError):
+        store.load(['old'])
@@ -0,0 +1,31 @@
+import numpy as np
+
+from engine import ModelParams, compute_batch
+from simulation import QUANTILES, Distribution, run_monte_carlo
+
+PARAMS = ModelParams.from_inputs({'chosen_fte': ['MedRep'], 'horizon_months': 24})
+DISTRIBUTIONS = {'pack_growth': Distribution('triangular', 0, 20, 10),
+                 'pack_price_pharmacy_change': Distribution('normal', -10, 10)}
+
+
+def test_same_seed_gives_the_same_result():
+    first, second = (run_monte_carlo(PARAMS, DISTRIBUTIONS, 5_000, seed=7, chunk_size=1_000) for _ in range(2))
+    other = run_monte_carlo(PARAMS, DISTRIBUTIONS, 5_000, seed=8, chunk_size=1_000)
+    for q in QUANTILES:
+        np.testing.assert_array_equal(first.quantiles[q], second.quantiles[q])
+    assert first.loss_probability == second.loss_probability
+    assert not np.array_equal(first.quantiles[50], other.quantiles[50])
+
+
+def test_quantiles_match_the_exact_percentiles():
+    draws, seed = 20_000, 3
+    sim = run_monte_carlo(PARAMS, DISTRIBUTIONS, draws, seed, chunk_size=draws)
+    # the same draws in one batch, kept whole
+    rng = np.random.default_rng(seed)
+    rolling_profit = compute_batch(PARAMS, {name: dist.sample(rng, draws)
+                                            for name, dist in DISTRIBUTIONS.items()}).rolling_profit
+    span = rolling_profit.max(axis=0) - rolling_profit.min(axis=0)
+    for q in QUANTILES:
+        # within a bin of the streaming histogram, 1/1024 of the range of the first batch
+        assert np.all(np.abs(sim.quantiles[q] - np.percentile(rolling_profit, q, axis=0)) <= span / 1024)
+    assert sim.loss_probability == np.mean(rolling_profit[:, -1] < 0)
@@ -0,0 +1,28 @@
+import numpy as np
+
+from engine import ModelParams, compute, with_inputs
+from solver import break_even_month, solve, total_profit
+
+PARAMS = ModelParams.from_inputs({'chosen_fte': ['MedRep'], 'horizon_months': 24})
+
+
+def test_solution_brings_total_profit_to_every_target():
+    targets = np.array([-5e6, 0, 2e6, 10e6])
+    values = solve(PARAMS, 'pack_price_owner', targets)
+    profit = total_profit(compute(with_inputs(PARAMS, {'pack_price_owner': values})))
+    # the bisection stops within a millionth of the price, a few rubles of profit
+    np.testing.assert_allclose(profit, targets, rtol=0, atol=100)
+
+
+def test_unreachable_target_is_nan():
+    values = solve(PARAMS, 'agency_fee', [0, 1e12])
+    assert not np.isnan(values[0])
+    assert np.isnan(values[1])
+
+
+def test_break_even_month():
+    result = compute(with_inputs(PARAMS, {'pack_price_owner': np.array([PARAMS.pack_price_owner, 1])}))
+    months = break_even_month(result)
+    assert months[1] == -1
+    assert result.rolling_profit[0, months[0]] >= 0
+    assert np.all(result.rolling_profit[0, :months[0]] < 0)
@@ -0,0 +1,57 @@
+from functools import lru_cache
+
+import numpy as np
+
+# non-working public holidays of the Russian Labour Code, month-day of every year
+RU_HOLIDAYS = ('01-01', '01-02', '01-03', '01-04', '01-05', '01-06', '01-07', '01-08',
+               '02-23', '03-08', '05-01', '05-09', '06-12', '11-04')
+
+# weekly volume -> days it is spread over: the legacy four weeks a month, every calendar day,
+# or working days without holidays
+VOLUME_CALENDARS = ['flat', 'calendar', 'workdays']
+
+
+def days(start: str, months: int) -> tuple:
+    """Every day of the horizon and the position of the first day of each month"""
+    first = np.datetime64(start, 'M') + np.arange(months + 1)
+    bounds = first.astype('datetime64[D]')
+    return np.arange(bounds[0], bounds[-1]), (bounds[:-1] - bounds[0]).astype(np.int64)
+
+
+def holiday_mask(day: np.ndarray, holidays: tuple = RU_HOLIDAYS) -> np.ndarray:
+    month = day.astype('datetime64[M]')
+    month_day = (month.astype(np.int64) % 12 + 1) * 100 + (day - month.astype('datetime64[D]')).astype(np.int64) + 1
+    return np.isin(month_day, [int(i[:2]) * 100 + int(i[3:]) for i in holidays])
+
+
+def day_weights(day: np.ndarray, mode: str, holidays: tuple = RU_HOLIDAYS) -> np.ndarray:
+    """Share of a week's volume that falls on each day"""
+    if mode == 'calendar':
+        return np.full(len(day), 1 / 7)
+    if mode == 'workdays':
+        weekday = (day.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday, Monday is 0
+        return ((weekday < 5) & ~holiday_mask(day, holidays)) / 5
+    raise ValueError(f'Unknown volume calendar: {mode}')
+
+
+def aggregate_days(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Sums of daily values (..., days) over the periods starting at positions starts"""
+    return np.add.reduceat(values, starts, axis=-1)
+
+
+@lru_cache(maxsize=64)
+def weeks_per_month(start: str, months: int, mode: str = 'flat', seasonality: tuple = (),
+                    holidays: tuple = RU_HOLIDAYS) -> np.ndarray:
+    """Weeks of volume in every month of the horizon, times the month-of-year seasonality multipliers.
+
+    'flat' is the legacy four weeks, 'calendar' days in month / 7, 'workdays' working days / 5."""
+    if mode == 'flat':
+        weeks = np.full(months, 4.0)
+    else:
+        day, starts = days(start, months)
+        weeks = aggregate_days(day_weights(day, mode, holidays), starts)
+    if seasonality:
+        month_of_year = (np.datetime64(start, 'M') + np.arange(months)).astype(np.int64) % 12
+        weeks = weeks * np.asarray(seasonality, dtype=float)[month_of_year]
+    weeks.setflags(write=False)
+    return weeks